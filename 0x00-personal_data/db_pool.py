@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Module for pooling database connections
+"""
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Iterator, Tuple
+
+
+class PooledCursor:
+    """
+    Cursor of a PooledConnection: it keeps the connection checked out
+    for as long as the cursor is referenced
+    """
+
+    def __init__(self, owner: 'PooledConnection', cursor: Any):
+        """
+        Wrap a cursor of the connection behind `owner`
+        """
+        self._owner = owner
+        self._cursor = cursor
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Delegate everything to the underlying cursor
+        """
+        return getattr(self._cursor, name)
+
+    def __iter__(self) -> Iterator:
+        """
+        Iterate over the rows of the underlying cursor
+        """
+        return iter(self._cursor)
+
+    def __enter__(self) -> 'PooledCursor':
+        """
+        Use the cursor as a context manager
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Close the cursor when leaving the context
+        """
+        self._cursor.close()
+
+
+class PooledConnection:
+    """
+    Proxy of a connection checked out of a ConnectionPool: it behaves
+    like the connection, but close() gives it back to the pool, as does
+    the garbage collection of a proxy that was never closed
+    """
+
+    def __init__(self, pool: 'ConnectionPool', connection: Any):
+        """
+        Wrap a connection checked out of `pool`
+        """
+        self._connection = connection
+        self._release = weakref.finalize(self, pool.release, connection)
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Delegate everything else to the underlying connection
+        """
+        if self._connection is None:
+            raise AttributeError("connection returned to the pool")
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs) -> PooledCursor:
+        """
+        Open a cursor that keeps this connection checked out
+        """
+        if self._connection is None:
+            raise AttributeError("connection returned to the pool")
+        return PooledCursor(self, self._connection.cursor(*args, **kwargs))
+
+    def close(self) -> None:
+        """
+        Return the connection to the pool instead of closing it
+        """
+        self._connection = None
+        self._release()
+
+    def __enter__(self) -> 'PooledConnection':
+        """
+        Use the connection as a context manager
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Return the connection to the pool when leaving the context
+        """
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of at most `max_size` connections
+
+    Idle connections are reused most recently released first; those idle
+    for more than `idle_timeout` seconds are closed whenever the pool is
+    used, and an idle connection is health-checked (with `is_connected()`
+    when it has one, outside of the pool lock since it may be a round
+    trip to the server) before being handed out again.
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_size: int = 5,
+                 idle_timeout: float = 300, acquire_timeout: float = 30):
+        """
+        Initialize an empty pool
+
+        Args:
+            connect: Function opening a new connection
+            max_size: Maximum number of open connections
+            idle_timeout: Seconds after which an idle connection is closed
+            acquire_timeout: Seconds to wait for a free connection
+        """
+        self.connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.size = 0
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._cond = threading.Condition()
+
+    def acquire(self) -> PooledConnection:
+        """
+        Check out a connection, opening one if none is idle
+
+        Raises:
+            TimeoutError: if all connections stay busy `acquire_timeout`
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            connection = None
+            with self._cond:
+                expired = self._expire_idle()
+                while connection is None:
+                    if self._idle:
+                        connection = self._idle.pop()[0]
+                    elif self.size < self.max_size:
+                        self.size += 1
+                        break
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._close_all(expired)
+                            raise TimeoutError(
+                                "no free connection in the pool")
+                        self._cond.wait(remaining)
+            self._close_all(expired)
+            if connection is None:
+                break
+            if self._is_healthy(connection):
+                return PooledConnection(self, connection)
+            self._discard(connection)
+
+        try:
+            return PooledConnection(self, self.connect())
+        except Exception:
+            with self._cond:
+                self.size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, connection: Any) -> None:
+        """
+        Give a connection back, rolling back any open transaction
+        """
+        try:
+            if getattr(connection, 'in_transaction', False):
+                connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            expired = self._expire_idle()
+            self._cond.notify()
+        self._close_all(expired)
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """
+        Context manager checking a connection out and back in
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        """
+        Close every idle connection
+        """
+        with self._cond:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self.size -= len(idle)
+            self._cond.notify_all()
+        self._close_all(idle)
+
+    def _is_healthy(self, connection: Any) -> bool:
+        """
+        Check that an idle connection is still usable
+        """
+        is_connected = getattr(connection, 'is_connected', None)
+        if is_connected is None:
+            return True
+        try:
+            return bool(is_connected())
+        except Exception:
+            return False
+
+    def _expire_idle(self) -> list:
+        """
+        Take the connections idle for more than `idle_timeout` out of the
+        pool and free their slots; the lock must be held
+
+        Returns:
+            The connections to close once the lock is released
+        """
+        expired = []
+        limit = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < limit:
+            expired.append(self._idle.popleft()[0])
+        self.size -= len(expired)
+        if expired:
+            self._cond.notify_all()
+        return expired
+
+    @staticmethod
+    def _close_all(connections: list) -> None:
+        """
+        Close connections, ignoring the errors of broken ones
+        """
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _discard(self, connection: Any) -> None:
+        """
+        Close a connection and free its slot
+        """
+        with self._cond:
+            self.size -= 1
+            self._cond.notify()
+        self._close_all([connection])
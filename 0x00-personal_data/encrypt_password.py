@@ -3,20 +3,128 @@
 Module for encrypting passwords
 """
 
+import os
+import time
+from typing import List, Optional, Tuple
+
 import bcrypt
 
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 4
+
+_rounds = None
+
+
+def measure_rounds(rounds: int, samples: int = 1) -> float:
+    """
+    Measure how long bcrypt takes at a work factor on this host
+
+    Args:
+        rounds: bcrypt work factor
+        samples: Number of hashes to average
+
+    Returns:
+        float: Average seconds per hash
+    """
+    salt = bcrypt.gensalt(rounds)
+    start = time.perf_counter()
+    for _ in range(samples):
+        bcrypt.hashpw(b"calibration", salt)
+    return (time.perf_counter() - start) / samples
+
+
+def cost_report(min_rounds: int = MIN_ROUNDS,
+                max_rounds: int = 14) -> List[Tuple[int, float]]:
+    """
+    Measure the latency of every work factor in a range
+
+    Returns:
+        List of (rounds, seconds per hash)
+    """
+    return [(rounds, measure_rounds(rounds))
+            for rounds in range(min_rounds, max_rounds + 1)]
+
+
+def calibrate_rounds(target_ms: float = 250, min_rounds: int = 10,
+                     max_rounds: int = 16) -> int:
+    """
+    Find the highest work factor whose hash stays within a target latency
+    on this host; each extra round doubles the cost, so the search stops
+    at the first factor past the target
+
+    Args:
+        target_ms: Target latency of a hash (or check) in milliseconds
+        min_rounds: Lowest work factor returned, whatever the host
+        max_rounds: Highest work factor tried
 
-def hash_password(password: str) -> bytes:
+    Returns:
+        int: Chosen work factor
+    """
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        if measure_rounds(rounds) * 1000 > target_ms:
+            break
+        chosen = rounds
+    return chosen
+
+
+def get_rounds() -> int:
+    """
+    Work factor of new hashes: PASSWORD_HASH_ROUNDS if set, otherwise
+    calibrated once to PASSWORD_HASH_TARGET_MS if set, otherwise bcrypt's
+    default of 12
+
+    Returns:
+        int: bcrypt work factor
+    """
+    global _rounds
+    if _rounds is None:
+        rounds = os.getenv('PASSWORD_HASH_ROUNDS')
+        target_ms = os.getenv('PASSWORD_HASH_TARGET_MS')
+        if rounds:
+            _rounds = int(rounds)
+        elif target_ms:
+            _rounds = calibrate_rounds(float(target_ms))
+        else:
+            _rounds = DEFAULT_ROUNDS
+    return _rounds
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """
+    Read the work factor of a bcrypt hash ($2b$<rounds>$...)
+
+    Returns:
+        int: Work factor the hash was made with
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    return int(hashed_password.split(b"$")[2])
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = None) -> bool:
+    """
+    Check whether a hash was made with another work factor than the
+    current one
+
+    Returns:
+        bool: True if the password should be hashed again
+    """
+    return hash_rounds(hashed_password) != (rounds or get_rounds())
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Hash a password using bcrypt
 
     Args:
         password: String password to hash
+        rounds: Work factor, get_rounds() by default
 
     Returns:
         bytes: Salted and hashed password
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or get_rounds())
     return bcrypt.hashpw(password.encode('utf-8'), salt)
 
 
@@ -32,3 +140,28 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         bool: True if password matches, False otherwise
     """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def verify_and_update(hashed_password: bytes,
+                      password: str) -> Tuple[bool, Optional[bytes]]:
+    """
+    Validate a password and, when it matches a hash made with another
+    work factor, hash it again at the current one
+
+    Args:
+        hashed_password: Bytes of the hashed password
+        password: String of the password to check
+
+    Returns:
+        (valid, new hash to store or None)
+    """
+    if not is_valid(hashed_password, password):
+        return False, None
+    if needs_rehash(hashed_password):
+        return True, hash_password(password)
+    return True, None
+
+
+if __name__ == "__main__":
+    for rounds, seconds in cost_report():
+        print("rounds {:2d}: {:9.2f} ms".format(rounds, seconds * 1000))
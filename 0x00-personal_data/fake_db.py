@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for a MySQL connection, to exercise get_db() and its
+pool without a database server:
+
+    filtered_logger.set_pool(ConnectionPool(fake_db.connector(rows)))
+"""
+import time
+from typing import Callable, List, Sequence, Tuple
+
+USERS_COLUMNS = ('name', 'email', 'phone', 'ssn', 'password', 'ip',
+                 'last_login', 'user_agent')
+
+
+class FakeCursor:
+    """
+    Cursor returning the rows of its connection for any query
+    """
+
+    def __init__(self, connection: 'FakeConnection'):
+        """
+        Open a cursor on `connection`
+        """
+        self.connection = connection
+        self.column_names: Tuple[str, ...] = ()
+        self.description: List[tuple] = []
+        self._rows: List[tuple] = []
+
+    def execute(self, operation: str, params: Sequence = None) -> None:
+        """
+        Record the query and make the rows of the connection available
+        """
+        self.connection.queries.append((operation, params))
+        self.column_names = tuple(self.connection.columns)
+        self.description = [(name,) for name in self.column_names]
+        self._rows = list(self.connection.rows)
+
+    def fetchone(self) -> tuple:
+        """
+        Return the next row, or None
+        """
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size: int = 1) -> List[tuple]:
+        """
+        Return up to `size` next rows
+        """
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchall(self) -> List[tuple]:
+        """
+        Return the remaining rows
+        """
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __iter__(self):
+        """
+        Iterate over the remaining rows
+        """
+        while self._rows:
+            yield self._rows.pop(0)
+
+    def close(self) -> None:
+        """
+        Close the cursor
+        """
+        self._rows = []
+
+
+class FakeConnection:
+    """
+    Connection answering every query with the same rows
+    """
+
+    def __init__(self, rows: Sequence[tuple] = (),
+                 columns: Sequence[str] = USERS_COLUMNS):
+        """
+        Open a connection serving `rows` made of `columns`
+        """
+        self.rows = rows
+        self.columns = columns
+        self.queries: List[tuple] = []
+        self.connected = True
+        self.in_transaction = False
+
+    def cursor(self, *args, **kwargs) -> FakeCursor:
+        """
+        Open a cursor
+        """
+        return FakeCursor(self)
+
+    def is_connected(self) -> bool:
+        """
+        Tell whether the connection is still open
+        """
+        return self.connected
+
+    def commit(self) -> None:
+        """
+        End the current transaction
+        """
+        self.in_transaction = False
+
+    def rollback(self) -> None:
+        """
+        Abort the current transaction
+        """
+        self.in_transaction = False
+
+    def close(self) -> None:
+        """
+        Close the connection
+        """
+        self.connected = False
+
+
+def connector(rows: Sequence[tuple] = (),
+              columns: Sequence[str] = USERS_COLUMNS,
+              delay: float = 0) -> Callable[[], FakeConnection]:
+    """
+    Returns a connect function for ConnectionPool opening FakeConnections,
+    each taking `delay` seconds to simulate the server handshake
+    """
+    def connect() -> FakeConnection:
+        """
+        Open a FakeConnection
+        """
+        if delay:
+            time.sleep(delay)
+        return FakeConnection(rows, columns)
+    return connect
+
+
+if __name__ == "__main__":
+    from db_pool import ConnectionPool
+
+    n, delay = 1000, 0.002
+    connect = connector(delay=delay)
+    start = time.perf_counter()
+    for _ in range(n):
+        connect().close()
+    direct = (time.perf_counter() - start) / n
+    pool = ConnectionPool(connect)
+    pool.acquire().close()
+    start = time.perf_counter()
+    for _ in range(n):
+        pool.acquire().close()
+    pooled = (time.perf_counter() - start) / n
+    print("connect: {:.1f} us, pooled acquire: {:.1f} us".format(
+        direct * 1e6, pooled * 1e6))
@@ -5,12 +5,26 @@ Module for handling Personal Data
 
 import re
 import logging
-import mysql.connector
 import os
-from typing import List
+from db_pool import ConnectionPool
+import sys
+import threading
+from collections import deque
+from collections.abc import Mapping
+from functools import lru_cache, partial
+from typing import (Callable, FrozenSet, Iterable, List, TextIO, Tuple,
+                    Union)
+try:
+    import mysql.connector
+except ImportError:
+    # get_db() can still serve a pool set with set_pool(), e.g. of
+    # fake_db connections
+    mysql = None
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+# from this many fields on, the tokenizer beats the regex alternation
+TOKENIZER_MIN_FIELDS = 200
 
 
 def filter_datum(fields: List[str], redaction: str, message: str,
@@ -27,14 +41,89 @@ def filter_datum(fields: List[str], redaction: str, message: str,
     Returns:
         String with sensitive information replaced by redaction
     """
-    for field in fields:
-        pattern = f'(?<=){field}=.*?{separator}'
-        message = re.sub(pattern, f'{field}={redaction}{separator}', message)
-    return message
+    return get_redactor(tuple(fields), redaction, separator)(message)
+
+
+@lru_cache(maxsize=64)
+def get_redactor(fields: Tuple[str, ...], redaction: str,
+                 separator: str) -> Callable[[str], str]:
+    """
+    Builds, once per (fields, redaction, separator), the function that
+    redacts all the fields of a message in a single pass
+
+    Args:
+        fields: Tuple of strings representing fields to obfuscate
+        redaction: String to replace sensitive information with
+        separator: String separator for fields in message
+
+    Returns:
+        Function taking a message and returning it redacted
+    """
+    if not fields:
+        # nothing to redact, str() returns the message itself
+        return str
+    if len(fields) >= TOKENIZER_MIN_FIELDS and separator and \
+            all(field and '=' not in field and separator not in field
+                and '\n' not in field for field in fields):
+        return partial(_redact_tokens, frozenset(fields),
+                       tuple(sorted({len(field) for field in fields})),
+                       redaction, separator)
+
+    if len(separator) == 1:
+        value = '[^{}\n]*'.format(re.escape(separator))
+    else:
+        value = '.*?'
+    pattern = re.compile('({})={}{}'.format(
+        '|'.join(re.escape(field) for field in fields), value,
+        re.escape(separator)))
+    replacement = '\\g<1>={}{}'.format(
+        redaction.replace('\\', '\\\\'), separator.replace('\\', '\\\\'))
+    return partial(pattern.sub, replacement)
+
+
+def _redact_tokens(fields: FrozenSet[str], lengths: Tuple[int, ...],
+                   redaction: str, separator: str, message: str) -> str:
+    """
+    Redacts a `key=value<separator>` message without regex: each '=' is
+    checked against the field names ending right before it
+
+    Args:
+        fields: Set of fields to obfuscate
+        lengths: Sorted distinct lengths of the fields
+        redaction: String to replace sensitive information with
+        separator: String separator for fields in message
+        message: String containing sensitive data
+
+    Returns:
+        String with sensitive information replaced by redaction
+    """
+    parts = []
+    start = 0
+    pos = message.find('=')
+    while pos != -1:
+        if any(message[pos - length:pos] in fields
+               for length in lengths if length <= pos - start):
+            end = message.find(separator, pos + 1)
+            if end == -1:
+                break
+            if message.find('\n', pos + 1, end) == -1:
+                parts.append(message[start:pos + 1])
+                parts.append(redaction)
+                start = end
+                pos = message.find('=', end + len(separator))
+                continue
+        pos = message.find('=', pos + 1)
+    parts.append(message[start:])
+    return ''.join(parts)
 
 
 class RedactingFormatter(logging.Formatter):
-    """ Redacting Formatter class """
+    """ Redacting Formatter class
+
+    A record whose message is a mapping (e.g. `logger.info(row_dict)`)
+    is rendered as `key=value; ` pairs with the values of PII keys
+    replaced by lookup, without scanning the rendered text.
+    """
 
     REDACTION = "***"
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
@@ -43,20 +132,183 @@ class RedactingFormatter(logging.Formatter):
     def __init__(self, fields: List[str]):
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.field_set = frozenset(fields)
 
     def format(self, record: logging.LogRecord) -> str:
         """
         Format log records and redact sensitive information
         """
-        record.msg = filter_datum(self.fields, self.REDACTION,
-                                  record.getMessage(), self.SEPARATOR)
+        if isinstance(record.msg, Mapping):
+            record.msg = self.render(record.msg)
+        else:
+            record.msg = filter_datum(self.fields, self.REDACTION,
+                                      record.getMessage(), self.SEPARATOR)
+        record.args = None
         return super().format(record)
 
+    def render(self, data: Union[Mapping, Iterable[Tuple[str, object]]]
+               ) -> str:
+        """
+        Render a mapping, or (key, value) pairs, as a redacted message
+
+        Args:
+            data: Mapping or iterable of (key, value) pairs
+
+        Returns:
+            String of `key=value; ` pairs, PII values redacted
+        """
+        items = data.items() if isinstance(data, Mapping) else data
+        return "".join(
+            "{}={}{} ".format(key, self.REDACTION
+                              if key in self.field_set else value,
+                              self.SEPARATOR)
+            for key, value in items)
+
+
+class AsyncRedactingHandler(logging.Handler):
+    """
+    Handler queueing records so that formatting (redaction) and writing
+    happen on a background thread, in batches
 
-def get_logger() -> logging.Logger:
+    When the queue holds `capacity` records, the overflow policy decides:
+    'block' waits for room, 'drop_oldest' discards the oldest queued
+    record and 'sample' keeps one in `sample_rate` new records (in place
+    of the oldest) and discards the others. Queued records are written
+    by flush() and close(), which logging.shutdown() calls at exit.
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'sample')
+
+    def __init__(self, stream: TextIO = None, capacity: int = 10000,
+                 overflow: str = 'block', batch_size: int = 500,
+                 sample_rate: int = 10):
+        """
+        Start the background thread writing to `stream` (stderr by
+        default), with a queue of `capacity` records, the `overflow`
+        policy, `batch_size` records per write and one kept record in
+        `sample_rate` under the 'sample' policy
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy: {}".format(overflow))
+        super(AsyncRedactingHandler, self).__init__()
+        self.stream = sys.stderr if stream is None else stream
+        self.capacity = capacity
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._records = deque()
+        self._unwritten = 0
+        self._overflowed = 0
+        self._closing = False
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._write_loop,
+                                        name="AsyncRedactingHandler",
+                                        daemon=True)
+        self._worker.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Queue a record; only its message arguments are merged here, a
+        mapping message is copied and left for the formatter
+        """
+        try:
+            if isinstance(record.msg, Mapping):
+                record.msg = dict(record.msg)
+            else:
+                record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+                record.exc_info = None
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self._cond:
+            if self._closing:
+                return
+            if len(self._records) >= self.capacity:
+                if self.overflow == 'block':
+                    while len(self._records) >= self.capacity and \
+                            not self._closing:
+                        self._cond.wait()
+                elif self.overflow == 'sample':
+                    self._overflowed += 1
+                    if self._overflowed % self.sample_rate != 0:
+                        self.dropped += 1
+                        return
+                if len(self._records) >= self.capacity:
+                    self._records.popleft()
+                    self._unwritten -= 1
+                    self.dropped += 1
+            self._records.append(record)
+            self._unwritten += 1
+            self._cond.notify_all()
+
+    def _write_loop(self) -> None:
+        """
+        Background loop formatting and writing queued records in batches
+        """
+        while True:
+            with self._cond:
+                while not self._records and not self._closing:
+                    self._cond.wait()
+                if not self._records:
+                    return
+                count = min(len(self._records), self.batch_size)
+                batch = [self._records.popleft() for _ in range(count)]
+                self._cond.notify_all()
+
+            lines = []
+            for record in batch:
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+            try:
+                if lines:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+            except Exception:
+                self.handleError(batch[-1])
+
+            with self._cond:
+                self._unwritten -= count
+                self._cond.notify_all()
+
+    def flush(self) -> None:
+        """
+        Wait until every queued record has been written
+        """
+        with self._cond:
+            while self._unwritten > 0 and self._worker.is_alive():
+                self._cond.wait()
+
+    def close(self) -> None:
+        """
+        Write the queued records, then stop the background thread
+        """
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._worker.join()
+        super(AsyncRedactingHandler, self).close()
+
+
+def get_logger(asynchronous: bool = False,
+               overflow: str = 'block') -> logging.Logger:
     """
     Creates a logger for handling personal data
 
+    Args:
+        asynchronous: Redact and write records on a background thread;
+            an asynchronous handler already on the logger is reused
+            rather than adding another one, and another thread
+        overflow: Policy of the asynchronous handler when its queue is
+            full: 'block', 'drop_oldest' or 'sample'
+
     Returns:
         logging.Logger: Configured logger object
     """
@@ -64,20 +316,31 @@ def get_logger() -> logging.Logger:
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
-    logger.addHandler(stream_handler)
+    if asynchronous:
+        for handler in logger.handlers:
+            if isinstance(handler, AsyncRedactingHandler):
+                return logger
+        handler = AsyncRedactingHandler(overflow=overflow)
+    else:
+        handler = logging.StreamHandler()
+    handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    logger.addHandler(handler)
 
     return logger
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
+def connect_db() -> 'mysql.connector.connection.MySQLConnection':
     """
-    Creates a connector to the database
+    Opens a new connection to the database
 
     Returns:
         MySQLConnection: Database connection object
+
+    Raises:
+        ImportError: if mysql-connector-python is not installed
     """
+    if mysql is None:
+        raise ImportError("mysql-connector-python is not installed")
     username = os.getenv('PERSONAL_DATA_DB_USERNAME', 'root')
     password = os.getenv('PERSONAL_DATA_DB_PASSWORD', '')
     host = os.getenv('PERSONAL_DATA_DB_HOST', 'localhost')
@@ -91,9 +354,107 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     )
 
 
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the connection pool of the module, created on first use with
+    PERSONAL_DATA_DB_POOL_SIZE connections at most (5 by default), closed
+    after PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT idle seconds (300)
+
+    Returns:
+        ConnectionPool: Pool opening connections with connect_db()
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                connect_db,
+                max_size=int(os.getenv('PERSONAL_DATA_DB_POOL_SIZE', '5')),
+                idle_timeout=float(os.getenv(
+                    'PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT', '300')))
+        return _pool
+
+
+def set_pool(pool: ConnectionPool) -> None:
+    """
+    Replaces the connection pool of the module, closing the idle
+    connections of the previous one; fake_db.connector() makes a pool
+    that needs no database server
+
+    Args:
+        pool: Pool get_db() checks connections out of from now on
+    """
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    if previous is not None:
+        previous.close()
+
+
+def get_db() -> 'mysql.connector.connection.MySQLConnection':
+    """
+    Creates a connector to the database, checked out of the pool: it is
+    used like a plain connection and close() gives it back
+
+    Returns:
+        MySQLConnection: Database connection object
+    """
+    return get_pool().acquire()
+
+
+def export_users(cursor, stream: TextIO = None,
+                 batch_size: int = 1000) -> int:
+    """
+    Streams the filtered users table: rows are fetched `batch_size` at a
+    time, redacted by column name and written in one write per batch,
+    with the same line format as the user_data logger
+
+    Args:
+        cursor: DB-API cursor; an unbuffered one keeps memory constant
+        stream: Text stream to write to, standard error by default
+        batch_size: Number of rows fetched, redacted and written at once
+
+    Returns:
+        int: Number of exported rows
+    """
+    stream = sys.stderr if stream is None else stream
+    cursor.execute("SELECT * FROM users;")
+    fields = [column[0] for column in cursor.description]
+    formatter = RedactingFormatter(PII_FIELDS)
+
+    count = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        messages = [formatter.render(zip(fields, row)) for row in rows]
+        # the formatted empty message is the "[HOLBERTON] ...: " prefix
+        prefix = formatter.format(logging.LogRecord(
+            "user_data", logging.INFO, __file__, 0, "", None, None))
+        stream.write("".join(prefix + message + "\n"
+                             for message in messages))
+        count += len(rows)
+    return count
+
+
 def main():
-    """Main function to retrieve and display filtered user data"""
+    """Main function to retrieve and display filtered user data
+
+    With PERSONAL_DATA_EXPORT_BATCH_SIZE set, rows are streamed through
+    export_users() by batches of that size instead of logged one by one.
+    """
     db = get_db()
+    batch_size = int(os.getenv('PERSONAL_DATA_EXPORT_BATCH_SIZE', '0'))
+    if batch_size > 0:
+        cursor = db.cursor(buffered=False)
+        export_users(cursor, batch_size=batch_size)
+        cursor.close()
+        db.close()
+        return
+
     cursor = db.cursor()
     cursor.execute("SELECT * FROM users;")
 
@@ -101,9 +462,7 @@ def main():
     fields = cursor.column_names
 
     for row in cursor:
-        message = "".join(f"{fields[i]}={str(row[i])}; "
-                          for i in range(len(fields)))
-        logger.info(message)
+        logger.info(dict(zip(fields, row)))
 
     cursor.close()
     db.close()
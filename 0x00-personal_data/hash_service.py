@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Module running bcrypt hashing on a bounded pool of workers
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from typing import Iterable, List, Tuple
+
+from encrypt_password import hash_password, is_valid
+
+
+class HashServiceBusy(Exception):
+    """
+    Raised when the service already has `max_pending` hashes in flight
+    """
+
+
+class HashService:
+    """
+    Runs hash_password and is_valid on a pool of threads (bcrypt releases
+    the GIL) or of processes
+
+    At most `max_pending` operations are queued or running at once: past
+    that, submit_hash and submit_verify wait up to `admission_timeout`
+    seconds for a slot (not at all by default) then raise HashServiceBusy,
+    so a login flood fails fast instead of queueing without bound.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None,
+                 admission_timeout: float = 0, processes: bool = False):
+        """
+        Initialize the service
+
+        Args:
+            max_workers: Number of workers, one per CPU by default
+            max_pending: Operations admitted at once, 4 per worker by default
+            admission_timeout: Seconds to wait for a slot, None to block
+            processes: Use a process pool instead of a thread pool
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.max_workers
+        self.admission_timeout = admission_timeout
+        pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.executor: Executor = pool_class(max_workers=self.max_workers)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _submit(self, block: bool, fn, *args) -> Future:
+        """
+        Admit an operation and run it on the pool
+
+        Raises:
+            HashServiceBusy: if no slot frees up in time
+        """
+        if block:
+            self._slots.acquire()
+        elif not self._slots.acquire(timeout=self.admission_timeout):
+            raise HashServiceBusy("too many pending password hashes")
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def submit_hash(self, password: str) -> Future:
+        """
+        Hash a password on the pool
+
+        Returns:
+            Future: Resolves to the salted hash
+        """
+        return self._submit(False, hash_password, password)
+
+    def submit_verify(self, hashed_password: bytes, password: str) -> Future:
+        """
+        Check a password against its hash on the pool
+
+        Returns:
+            Future: Resolves to True if the password matches
+        """
+        return self._submit(False, is_valid, hashed_password, password)
+
+    def hash_many(self, passwords: Iterable[str]) -> List[bytes]:
+        """
+        Hash passwords in parallel, waiting for free slots instead of
+        failing, so that a batch never holds more than `max_pending` slots
+
+        Returns:
+            List of the hashes, in the order of `passwords`
+        """
+        futures = [self._submit(True, hash_password, password)
+                   for password in passwords]
+        return [future.result() for future in futures]
+
+    def verify_many(self,
+                    pairs: Iterable[Tuple[bytes, str]]) -> List[bool]:
+        """
+        Check (hashed password, password) pairs in parallel, waiting for
+        free slots instead of failing
+
+        Returns:
+            List of the results, in the order of `pairs`
+        """
+        futures = [self._submit(True, is_valid, hashed_password, password)
+                   for hashed_password, password in pairs]
+        return [future.result() for future in futures]
+
+    async def hash_async(self, password: str) -> bytes:
+        """
+        Hash a password on the pool without blocking the event loop
+        """
+        return await asyncio.wrap_future(self.submit_hash(password))
+
+    async def verify_async(self, hashed_password: bytes,
+                           password: str) -> bool:
+        """
+        Check a password on the pool without blocking the event loop
+        """
+        return await asyncio.wrap_future(
+            self.submit_verify(hashed_password, password))
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Shut the pool down
+        """
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self) -> 'HashService':
+        """
+        Use the service as a context manager
+        """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """
+        Shut the pool down when leaving the context
+        """
+        self.close()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_hash_service() -> HashService:
+    """
+    Returns the shared service of the process, created on first use with
+    PASSWORD_HASH_WORKERS workers (one per CPU by default) and
+    PASSWORD_HASH_MAX_PENDING admitted operations (4 per worker)
+
+    Returns:
+        HashService: Thread pool backed hashing service
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = HashService(
+                max_workers=int(os.getenv('PASSWORD_HASH_WORKERS', '0')),
+                max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', '0')))
+        return _service
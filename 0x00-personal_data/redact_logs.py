@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Command-line tool redacting existing log files with the filtered_logger
+rules, in parallel
+"""
+import argparse
+import mmap
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, get_redactor
+
+
+def chunk_offsets(file_path: str, chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Splits a file into (start, end) byte ranges of about `chunk_size`
+    bytes, each ending on a line boundary
+
+    Args:
+        file_path: Path of the file to split
+        chunk_size: Approximate size of a chunk in bytes
+
+    Returns:
+        List of (start, end) byte offsets covering the whole file
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return []
+
+    offsets = []
+    with open(file_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = mm.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            offsets.append((start, end))
+            start = end
+    return offsets
+
+
+def redact_chunk(chunk: Tuple[str, int, int]) -> bytes:
+    """
+    Redacts one byte range of a file, read through a memory map
+
+    Args:
+        chunk: (file path, start offset, end offset)
+
+    Returns:
+        bytes: The redacted range
+    """
+    file_path, start, end = chunk
+    with open(file_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        text = mm[start:end].decode('utf-8', 'surrogateescape')
+    redact = get_redactor(tuple(PII_FIELDS), RedactingFormatter.REDACTION,
+                          RedactingFormatter.SEPARATOR)
+    return redact(text).encode('utf-8', 'surrogateescape')
+
+
+def redact_files(file_paths: List[str], jobs: int = None,
+                 chunk_size: int = 4 * 1024 * 1024) -> Iterator[bytes]:
+    """
+    Redacts files chunk by chunk across a process pool; at most two
+    chunks per worker are in flight, so a slow reader of the iterator
+    holds back the workers instead of letting results pile up in memory
+
+    Args:
+        file_paths: Paths of the log files, processed in this order
+        jobs: Number of worker processes, one per CPU by default
+        chunk_size: Approximate size of a chunk in bytes
+
+    Returns:
+        Iterator over the redacted chunks, in file order
+    """
+    chunks = [(file_path, start, end) for file_path in file_paths
+              for start, end in chunk_offsets(file_path, chunk_size)]
+    if jobs == 1:
+        yield from map(redact_chunk, chunks)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        window = deque()
+        for chunk in chunks:
+            window.append(pool.submit(redact_chunk, chunk))
+            if len(window) >= 2 * jobs:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def main(argv: List[str] = None) -> None:
+    """Parses the command line and writes the redacted logs"""
+    parser = argparse.ArgumentParser(
+        description="Redact PII fields ({}) in log files".format(
+            ", ".join(PII_FIELDS)))
+    parser.add_argument('files', nargs='+', help="log files to redact")
+    parser.add_argument('-o', '--output',
+                        help="output file (default: standard output)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=4,
+                        help="chunk size in MiB (default: 4)")
+    args = parser.parse_args(argv)
+
+    output = sys.stdout.buffer if args.output is None \
+        else open(args.output, 'wb')
+    try:
+        for redacted in redact_files(args.files, args.jobs,
+                                     args.chunk_size * 1024 * 1024):
+            output.write(redacted)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
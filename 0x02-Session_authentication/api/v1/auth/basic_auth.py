@@ -4,6 +4,11 @@ Basic authentication module for the API
 """
 from api.v1.auth.auth import Auth
 import base64
+from collections import OrderedDict
+import hashlib
+from os import getenv
+import threading
+import time
 from typing import TypeVar
 from models.user import User
 
@@ -11,7 +16,19 @@ from models.user import User
 class BasicAuth(Auth):
     """
     Basic Authentication class
+
+    Verified Authorization headers are kept in a bounded LRU cache
+    (BASIC_AUTH_CACHE_SIZE entries, 0 disables it) for
+    BASIC_AUTH_CACHE_TTL seconds, so repeated requests skip the
+    credentials check. An entry is dropped as soon as the user is
+    removed or its email or password changes.
     """
+    cache_size = int(getenv('BASIC_AUTH_CACHE_SIZE', '1024'))
+    cache_ttl = int(getenv('BASIC_AUTH_CACHE_TTL', '300'))
+    cache_hits = 0
+    cache_misses = 0
+    verified_credentials = OrderedDict()
+    cache_lock = threading.Lock()
 
     def extract_base64_authorization_header(
             self, authorization_header: str) -> str:
@@ -84,6 +101,45 @@ class BasicAuth(Auth):
         except Exception:
             return None
 
+    def cached_user(self, authorization_header: str) -> TypeVar('User'):
+        """
+        Returns the User verified earlier for this Authorization header,
+        or None if there is no valid cache entry
+        """
+        if self.cache_size <= 0:
+            return None
+
+        key = hashlib.sha256(authorization_header.encode()).digest()
+        with self.cache_lock:
+            entry = self.verified_credentials.get(key)
+            if entry is not None:
+                user_id, email, password, expires_at = entry
+                user = User.get(user_id)
+                if expires_at > time.monotonic() and user is not None \
+                        and user.email == email and user.password == password:
+                    self.verified_credentials.move_to_end(key)
+                    BasicAuth.cache_hits += 1
+                    return user
+                del self.verified_credentials[key]
+            BasicAuth.cache_misses += 1
+        return None
+
+    def cache_user(self, authorization_header: str, user: TypeVar('User')):
+        """
+        Remembers that the Authorization header authenticates the user
+        """
+        if self.cache_size <= 0:
+            return
+
+        key = hashlib.sha256(authorization_header.encode()).digest()
+        expires_at = time.monotonic() + self.cache_ttl
+        with self.cache_lock:
+            self.verified_credentials[key] = (user.id, user.email,
+                                              user.password, expires_at)
+            self.verified_credentials.move_to_end(key)
+            while len(self.verified_credentials) > self.cache_size:
+                self.verified_credentials.popitem(last=False)
+
     def current_user(self, request=None) -> TypeVar('User'):
         """
         Retrieves the User instance for a request
@@ -93,6 +149,10 @@ class BasicAuth(Auth):
         if not auth_header:
             return None
 
+        user = self.cached_user(auth_header)
+        if user is not None:
+            return user
+
         # Extract and decode Base64 authorization header
         base64_auth = self.extract_base64_authorization_header(auth_header)
         if not base64_auth:
@@ -108,4 +168,7 @@ class BasicAuth(Auth):
             return None
 
         # Get user instance
-        return self.user_object_from_credentials(email, password)
+        user = self.user_object_from_credentials(email, password)
+        if user is not None:
+            self.cache_user(auth_header, user)
+        return user
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Redis server, speaking enough of the protocol
+(RESP) for RedisSessionStore: PING, SELECT, SET (with EX), GET, DEL and
+FLUSHDB. Run it with `python3 -m api.v1.auth.fake_redis [port]`.
+"""
+from typing import List
+import socketserver
+import sys
+import threading
+import time
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Serves the commands of one client connection"""
+
+    def handle(self) -> None:
+        """Reads commands until the client disconnects"""
+        db = 0
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            name = args[0].upper()
+            if name == b"SELECT":
+                db = int(args[1])
+                reply = b"+OK\r\n"
+            else:
+                reply = self.server.execute(db, name, args[1:])
+            self.wfile.write(reply)
+
+    def read_command(self) -> List[bytes]:
+        """Reads one array of bulk strings, or None at end of stream"""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            raise ValueError("inline commands are not supported")
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """In-memory key-value server, one thread per client"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 0)):
+        """Binds the server; port 0 picks a free port"""
+        super().__init__(address, FakeRedisHandler)
+        self.databases = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """redis:// URL of the server"""
+        host, port = self.server_address[:2]
+        return "redis://{}:{}/0".format(host, port)
+
+    def start(self) -> 'FakeRedisServer':
+        """Serves in a background thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def execute(self, db: int, name: bytes, args: List[bytes]) -> bytes:
+        """Runs one command and returns its encoded reply"""
+        with self.lock:
+            data = self.databases.setdefault(db, {})
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name == b"SET":
+                expires_at = None
+                if len(args) >= 4 and args[2].upper() == b"EX":
+                    expires_at = time.monotonic() + int(args[3])
+                data[args[0]] = (args[1], expires_at)
+                return b"+OK\r\n"
+            if name == b"GET":
+                value = self.lookup(data, args[0])
+                if value is None:
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(value), value)
+            if name == b"DEL":
+                count = sum(1 for key in args
+                            if self.lookup(data, key) is not None
+                            and data.pop(key, None) is not None)
+                return b":%d\r\n" % count
+            if name == b"FLUSHDB":
+                data.clear()
+                return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    @staticmethod
+    def lookup(data: dict, key: bytes) -> bytes:
+        """Returns the value of a key, dropping it if expired"""
+        entry = data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del data[key]
+            return None
+        return value
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    server = FakeRedisServer(("127.0.0.1", port))
+    print("fake Redis listening on {}".format(server.url))
+    server.serve_forever()
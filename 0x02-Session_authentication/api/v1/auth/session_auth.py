@@ -3,13 +3,32 @@
 Session authentication module
 """
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import SessionStore, get_session_store
+from datetime import datetime
 from models.user import User
 import uuid
 
 
 class SessionAuth(Auth):
-    """Session Authentication class"""
+    """Session Authentication class
+
+    Sessions are kept in the store selected by SESSION_STORE, by default
+    `user_id_by_session_id` in the current process, which maps a Session
+    ID to its User ID (subclasses setting `user_id_only` to False store
+    the whole session dictionary there).
+    """
     user_id_by_session_id = {}
+    session_duration = 0
+    user_id_only = True
+
+    def __init__(self):
+        """Initializes the session storage"""
+        self.store = self.make_store()
+
+    def make_store(self) -> SessionStore:
+        """Returns the session storage selected by SESSION_STORE"""
+        return get_session_store(self.user_id_by_session_id,
+                                 self.user_id_only)
 
     def create_session(self, user_id: str = None) -> str:
         """Creates a Session ID for a user_id"""
@@ -17,7 +36,10 @@ class SessionAuth(Auth):
             return None
 
         session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[session_id] = user_id
+        self.store.set(session_id, {
+            'user_id': user_id,
+            'created_at': datetime.now(),
+        }, self.session_duration)
         return session_id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
@@ -25,7 +47,10 @@ class SessionAuth(Auth):
         if session_id is None or not isinstance(session_id, str):
             return None
 
-        return self.user_id_by_session_id.get(session_id)
+        session = self.store.get(session_id)
+        if session is None:
+            return None
+        return session.get('user_id')
 
     def current_user(self, request=None):
         """Returns a User instance based on a cookie value"""
@@ -55,5 +80,4 @@ class SessionAuth(Auth):
         if not user_id:
             return False
 
-        del self.user_id_by_session_id[session_id]
-        return True
+        return self.store.delete(session_id)
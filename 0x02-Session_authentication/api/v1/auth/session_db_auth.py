@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Session authentication with sessions stored in the database module
+"""
+from api.v1.auth.session_exp_auth import SessionExpAuth
+from datetime import datetime, timedelta
+from models.user_session import UserSession
+from typing import List
+import uuid
+
+
+class SessionDBAuth(SessionExpAuth):
+    """Session Authentication class persisting sessions as UserSession
+
+    UserSession indexes `session_id`, so a lookup doesn't scan the stored
+    sessions, and is journaled, so a login or logout appends one record
+    instead of rewriting the whole file.
+
+    Sessions stored by previous runs are scheduled for the reaper when
+    the class is instantiated, so those expired meanwhile are deleted.
+    """
+
+    def __init__(self):
+        """Initializes the expiration of the stored sessions"""
+        super().__init__()
+        if self.session_duration <= 0:
+            return
+        now = datetime.utcnow()
+        self.schedule_expirations(
+            ((user_session.created_at - now).total_seconds()
+             + self.session_duration, user_session.session_id)
+            for user_session in UserSession.all())
+
+    def make_store(self) -> None:
+        """Sessions are UserSession objects: no session storage is built,
+        whatever SESSION_STORE says"""
+        return None
+
+    def create_session(self, user_id: str = None) -> str:
+        """Creates and stores a new UserSession for a user_id"""
+        if user_id is None or not isinstance(user_id, str):
+            return None
+
+        session_id = str(uuid.uuid4())
+        user_session = UserSession(user_id=user_id, session_id=session_id)
+        user_session.save()
+        self.schedule_expiration(session_id)
+        return session_id
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """Returns the User ID of a stored, not expired, session"""
+        if session_id is None or not isinstance(session_id, str):
+            return None
+
+        sessions = UserSession.search({'session_id': session_id})
+        if not sessions:
+            return None
+        user_session = sessions[0]
+        if self.session_duration <= 0:
+            return user_session.user_id
+        # Base timestamps are UTC
+        expires_at = user_session.created_at + timedelta(
+            seconds=self.session_duration)
+        if expires_at < datetime.utcnow():
+            return None
+        return user_session.user_id
+
+    def destroy_session(self, request=None) -> bool:
+        """Deletes the UserSession of the request session cookie"""
+        if request is None:
+            return False
+
+        session_id = self.session_cookie(request)
+        if not session_id:
+            return False
+
+        sessions = UserSession.search({'session_id': session_id})
+        if not sessions:
+            return False
+        for user_session in sessions:
+            user_session.remove()
+        return True
+
+    def expire_sessions(self, session_ids: List[str]) -> None:
+        """Deletes a batch of expired UserSession"""
+        for session_id in session_ids:
+            for user_session in UserSession.search(
+                    {'session_id': session_id}):
+                user_session.remove()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark of SessionDBAuth login, lookup and logout throughput with many
+stored sessions:
+
+    python3 -m api.v1.auth.session_db_bench [-n SESSIONS] [-d DURATION]
+
+It runs in a temporary directory, so the .db_UserSession.* files of the
+current directory are left alone.
+"""
+from api.v1.auth.session_db_auth import SessionDBAuth
+from models.user_session import UserSession
+from typing import Callable
+import argparse
+import os
+import tempfile
+import time
+
+
+class Request:
+    """Stand-in for a Flask request carrying a session cookie"""
+
+    def __init__(self, session_id: str):
+        """Sets the session cookie"""
+        self.cookies = {os.getenv('SESSION_NAME', '_my_session_id'):
+                        session_id}
+
+
+def measure(name: str, operation: Callable[[int], None],
+            duration: float, limit: int = None) -> None:
+    """Calls operation(0), operation(1)... for `duration` seconds, or
+    `limit` times, and prints the calls per second"""
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < duration and count != limit:
+        operation(count)
+        count += 1
+    print("{:8s} {:>10,.0f} /s".format(
+        name, count / (time.perf_counter() - start)))
+
+
+def file_sizes() -> str:
+    """Sizes of the UserSession snapshot and journal files"""
+    return ", ".join("{} {:.1f} MiB".format(
+        file_path, os.path.getsize(file_path) / 2 ** 20)
+        for file_path in (".db_UserSession.json", ".db_UserSession.journal")
+        if os.path.exists(file_path))
+
+
+def main() -> None:
+    """Parses the command line and runs the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('-n', '--sessions', type=int, default=1000000)
+    parser.add_argument('-d', '--duration', type=float, default=3,
+                        help="seconds per operation (default: 3)")
+    args = parser.parse_args()
+
+    os.environ['SESSION_DURATION'] = '0'
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        UserSession.load_from_file()
+        start = time.perf_counter()
+        for i in range(0, args.sessions, 10000):
+            UserSession.save_many(
+                UserSession(user_id="user-{}".format(j % 1000),
+                            session_id="stored-{}".format(j))
+                for j in range(i, min(i + 10000, args.sessions)))
+        UserSession.save_to_file()
+        print("stored {:,} sessions in {:.1f} s ({})".format(
+            args.sessions, time.perf_counter() - start, file_sizes()))
+        start = time.perf_counter()
+        UserSession.load_from_file()
+        print("loaded them in {:.1f} s".format(time.perf_counter() - start))
+
+        auth = SessionDBAuth()
+        session_ids = []
+        measure("login", lambda i: session_ids.append(
+            auth.create_session("user-{}".format(i % 1000))), args.duration)
+        measure("lookup", lambda i: auth.user_id_for_session_id(
+            session_ids[i % len(session_ids)]), args.duration)
+        logouts = [Request(session_id) for session_id in session_ids]
+        measure("logout", lambda i: auth.destroy_session(logouts[i]),
+                args.duration, len(logouts))
+        print("after the run: {}".format(file_sizes()))
+        UserSession._journal_close()
+
+
+if __name__ == "__main__":
+    main()
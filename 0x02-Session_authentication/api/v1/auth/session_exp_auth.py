@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Session authentication with expiration module
+"""
+from api.v1.auth.session_auth import SessionAuth
+from datetime import datetime, timedelta
+from os import getenv
+from typing import Iterable, List, Tuple
+import heapq
+import logging
+import threading
+import time
+
+
+class SessionExpAuth(SessionAuth):
+    """Session Authentication class with expiring sessions
+
+    Sessions expire SESSION_DURATION seconds after their creation (never
+    if it is 0 or less). Expiry is checked on each lookup, and a reaper
+    thread deletes expired sessions in batches, taking them from a heap
+    ordered by expiration time instead of scanning every session.
+    """
+    user_id_only = False
+    reap_batch_size = 1000
+    reap_retry_delay = 5
+
+    def __init__(self):
+        """Initializes the session duration and the expiry heap"""
+        super().__init__()
+        try:
+            self.session_duration = int(getenv('SESSION_DURATION', '0'))
+        except ValueError:
+            self.session_duration = 0
+        self.expirations = []
+        self.reaper_condition = threading.Condition()
+        self.reaper = None
+
+    def create_session(self, user_id: str = None) -> str:
+        """Creates a Session ID and schedules its expiration"""
+        session_id = super().create_session(user_id)
+        if session_id is None:
+            return None
+
+        self.schedule_expiration(session_id)
+        return session_id
+
+    def schedule_expiration(self, session_id: str) -> None:
+        """Queues a new session for the reaper"""
+        if self.session_duration <= 0:
+            return
+
+        expires_at = time.monotonic() + self.session_duration
+        with self.reaper_condition:
+            heapq.heappush(self.expirations, (expires_at, session_id))
+            if self.reaper is None:
+                self.start_reaper()
+            elif self.expirations[0][1] == session_id:
+                self.reaper_condition.notify()
+
+    def schedule_expirations(self,
+                             sessions: Iterable[Tuple[float, str]]) -> None:
+        """Queues existing sessions for the reaper, as (seconds left
+        before expiry, session ID); those already expired are reaped
+        right away"""
+        if self.session_duration <= 0:
+            return
+
+        now = time.monotonic()
+        with self.reaper_condition:
+            self.expirations.extend((now + seconds_left, session_id)
+                                    for seconds_left, session_id in sessions)
+            heapq.heapify(self.expirations)
+            if not self.expirations:
+                return
+            if self.reaper is None:
+                self.start_reaper()
+            else:
+                self.reaper_condition.notify()
+
+    def start_reaper(self) -> None:
+        """Starts the reaper thread; reaper_condition must be held"""
+        self.reaper = threading.Thread(target=self.reap, daemon=True)
+        self.reaper.start()
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """Returns a User ID based on a Session ID, if not expired"""
+        if session_id is None or not isinstance(session_id, str):
+            return None
+
+        session = self.store.get(session_id)
+        if session is None:
+            return None
+        if self.session_duration <= 0:
+            return session.get('user_id')
+        created_at = session.get('created_at')
+        if created_at is None:
+            return None
+        if created_at + timedelta(seconds=self.session_duration) < \
+                datetime.now():
+            return None
+        return session.get('user_id')
+
+    def expire_sessions(self, session_ids: List[str]) -> None:
+        """Deletes a batch of expired sessions"""
+        self.store.delete_many(session_ids)
+
+    def reap(self) -> None:
+        """Reaper loop: waits for the next expiration, then deletes the
+        expired sessions by batches of `reap_batch_size`; a batch that
+        fails is queued again `reap_retry_delay` seconds later"""
+        while True:
+            with self.reaper_condition:
+                now = time.monotonic()
+                while not self.expirations or self.expirations[0][0] > now:
+                    timeout = None
+                    if self.expirations:
+                        timeout = self.expirations[0][0] - now
+                    self.reaper_condition.wait(timeout)
+                    now = time.monotonic()
+                expired = []
+                while self.expirations and \
+                        self.expirations[0][0] <= now and \
+                        len(expired) < self.reap_batch_size:
+                    expired.append(heapq.heappop(self.expirations)[1])
+            try:
+                self.expire_sessions(expired)
+            except Exception:
+                # the store may be briefly unavailable: lookups still
+                # refuse these sessions, and the whole batch is retried
+                # later (deleting those already gone is a no-op)
+                logging.getLogger(__name__).exception(
+                    "failed to delete %d expired sessions, retrying in %ss",
+                    len(expired), self.reap_retry_delay)
+                retry_at = time.monotonic() + self.reap_retry_delay
+                with self.reaper_condition:
+                    for session_id in expired:
+                        heapq.heappush(self.expirations,
+                                       (retry_at, session_id))
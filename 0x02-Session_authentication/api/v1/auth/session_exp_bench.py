@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark of SessionExpAuth with the memory store: memory per session,
+then create and lookup latencies under a steady churn of creates and
+expiries while the reaper runs:
+
+    python3 -m api.v1.auth.session_exp_bench [-n SESSIONS] [-t TTL]
+
+The store is filled with SESSIONS sessions whose expirations are spread
+over the next TTL seconds, as if they had been created at a steady
+rate; the churn phase then creates SESSIONS / TTL sessions per second,
+so the reaper deletes about as many as are created.
+"""
+from api.v1.auth.session_exp_auth import SessionExpAuth
+from datetime import datetime, timedelta
+from typing import List
+import argparse
+import os
+import random
+import resource
+import time
+
+
+def max_rss() -> int:
+    """Peak resident memory of the process, in bytes"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentiles(latencies: List[float]) -> str:
+    """Formats the p50, p99 and max of latencies in seconds"""
+    latencies = sorted(latencies)
+    if not latencies:
+        return "no samples"
+    return "p50 {:.1f} us, p99 {:.1f} us, max {:.1f} us".format(
+        latencies[len(latencies) // 2] * 1e6,
+        latencies[int(len(latencies) * 0.99)] * 1e6,
+        latencies[-1] * 1e6)
+
+
+def fill(auth: SessionExpAuth, sessions: int, ttl: int) -> List[str]:
+    """Stores `sessions` sessions expiring over the next `ttl` seconds
+    and schedules them for the reaper; returns their Session IDs"""
+    now = datetime.now()
+    session_ids = []
+    expirations = []
+    for i in range(sessions):
+        session_id = "session-{:09d}".format(i)
+        seconds_left = ttl * (i + 1) / sessions
+        auth.store.set(session_id, {
+            'user_id': "user-{}".format(i % 1000),
+            'created_at': now - timedelta(seconds=ttl - seconds_left),
+        })
+        session_ids.append(session_id)
+        expirations.append((seconds_left, session_id))
+    auth.schedule_expirations(expirations)
+    return session_ids
+
+
+def churn(auth: SessionExpAuth, session_ids: List[str], rate: float,
+          duration: float) -> None:
+    """Creates `rate` sessions per second and looks up random ones for
+    `duration` seconds, then prints the latencies and the reaper lag"""
+    creates, lookups, lags = [], [], []
+    start = time.monotonic()
+    created = 0
+    while True:
+        now = time.monotonic()
+        if now - start >= duration:
+            break
+        while created < (now - start) * rate:
+            t0 = time.perf_counter()
+            auth.create_session("user-{}".format(created % 1000))
+            creates.append(time.perf_counter() - t0)
+            created += 1
+        for session_id in random.sample(session_ids, 100):
+            t0 = time.perf_counter()
+            auth.user_id_for_session_id(session_id)
+            lookups.append(time.perf_counter() - t0)
+        with auth.reaper_condition:
+            if auth.expirations:
+                lags.append(max(0, now - auth.expirations[0][0]))
+
+    print("creates: {:,} ({})".format(len(creates), percentiles(creates)))
+    print("lookups: {:,} ({})".format(len(lookups), percentiles(lookups)))
+    print("reaper lag: max {:.1f} ms".format(max(lags, default=0) * 1e3))
+
+
+def main() -> None:
+    """Parses the command line and runs the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('-n', '--sessions', type=int, default=5000000)
+    parser.add_argument('-t', '--ttl', type=int, default=3600,
+                        help="session duration in seconds (default: 3600)")
+    parser.add_argument('-d', '--duration', type=float, default=10,
+                        help="churn phase in seconds (default: 10)")
+    args = parser.parse_args()
+
+    os.environ['SESSION_STORE'] = 'memory'
+    os.environ['SESSION_DURATION'] = str(args.ttl)
+    auth = SessionExpAuth()
+    rss = max_rss()
+    start = time.perf_counter()
+    session_ids = fill(auth, args.sessions, args.ttl)
+    print("filled {:,} sessions in {:.1f} s, {:.0f} bytes per session "
+          "(peak RSS {:.0f} MiB, Session ID list included)".format(
+              args.sessions, time.perf_counter() - start,
+              (max_rss() - rss) / args.sessions, max_rss() / 2 ** 20))
+
+    stored = len(auth.store.sessions)
+    churn(auth, session_ids, args.sessions / args.ttl, args.duration)
+    print("stored sessions: {:,} before churn, {:,} after".format(
+        stored, len(auth.store.sessions)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Session storage backends for session authentication
+"""
+from datetime import datetime
+from os import getenv
+from typing import Iterable
+from urllib.parse import urlparse
+import socket
+import sqlite3
+import threading
+
+
+class SessionStore:
+    """Interface of a session storage
+
+    A session is a dictionary with the `user_id` it belongs to and its
+    `created_at` datetime.
+    """
+
+    def set(self, session_id: str, session: dict, ttl: int = None) -> None:
+        """Stores a session; backends that can expire keys by themselves
+        drop it after `ttl` seconds"""
+        raise NotImplementedError()
+
+    def get(self, session_id: str) -> dict:
+        """Returns the session of a Session ID, or None"""
+        raise NotImplementedError()
+
+    def delete(self, session_id: str) -> bool:
+        """Deletes a session, returns False if it didn't exist"""
+        raise NotImplementedError()
+
+    def delete_many(self, session_ids: Iterable[str]) -> int:
+        """Deletes several sessions, returns how many existed"""
+        return sum(1 for session_id in session_ids
+                   if self.delete(session_id))
+
+
+class MemorySessionStore(SessionStore):
+    """Session storage in a dictionary of the current process
+
+    With `user_id_only`, the dictionary maps a Session ID straight to its
+    User ID, and the sessions it returns have no `created_at`.
+    """
+
+    def __init__(self, sessions: dict = None, user_id_only: bool = False):
+        """Initializes the store, optionally on an existing dictionary"""
+        self.sessions = {} if sessions is None else sessions
+        self.user_id_only = user_id_only
+
+    def set(self, session_id: str, session: dict, ttl: int = None) -> None:
+        """Stores a session"""
+        if self.user_id_only:
+            self.sessions[session_id] = session['user_id']
+        else:
+            self.sessions[session_id] = session
+
+    def get(self, session_id: str) -> dict:
+        """Returns the session of a Session ID, or None"""
+        session = self.sessions.get(session_id)
+        if session is not None and self.user_id_only:
+            return {'user_id': session, 'created_at': None}
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        """Deletes a session, returns False if it didn't exist"""
+        return self.sessions.pop(session_id, None) is not None
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session storage in a SQLite file shared by the workers of a host"""
+
+    def __init__(self, file_path: str):
+        """Initializes the store and creates its table if needed"""
+        self.file_path = file_path
+        self.local = threading.local()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, "
+            "user_id TEXT NOT NULL, "
+            "created_at TEXT NOT NULL)")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """SQLite connection of the current thread"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.file_path, timeout=30,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def set(self, session_id: str, session: dict, ttl: int = None) -> None:
+        """Stores a session"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+            (session_id, session['user_id'],
+             session['created_at'].isoformat()))
+
+    def get(self, session_id: str) -> dict:
+        """Returns the session of a Session ID, or None"""
+        row = self.connection.execute(
+            "SELECT user_id, created_at FROM sessions WHERE session_id = ?",
+            (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {'user_id': row[0],
+                'created_at': datetime.fromisoformat(row[1])}
+
+    def delete(self, session_id: str) -> bool:
+        """Deletes a session, returns False if it didn't exist"""
+        cursor = self.connection.execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, session_ids: Iterable[str]) -> int:
+        """Deletes several sessions in one transaction"""
+        connection = self.connection
+        connection.execute("BEGIN")
+        try:
+            cursor = connection.executemany(
+                "DELETE FROM sessions WHERE session_id = ?",
+                ((session_id,) for session_id in session_ids))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+
+class RedisSessionStore(SessionStore):
+    """Session storage in a server speaking the Redis protocol (RESP)"""
+
+    def __init__(self, url: str):
+        """Initializes the store from a redis://host:port/db URL"""
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.strip('/') or 0)
+        self.local = threading.local()
+
+    def connect(self) -> socket.socket:
+        """Returns the connection of the current thread"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            sock = socket.create_connection((self.host, self.port))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.local.connection = sock
+            self.local.reader = sock.makefile('rb')
+            if self.db:
+                self.command('SELECT', self.db)
+            connection = sock
+        return connection
+
+    def command(self, *args) -> object:
+        """Sends one command and returns its decoded reply"""
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        try:
+            self.connect().sendall(b"".join(parts))
+            return self.read_reply()
+        except OSError:
+            self.local.connection = None
+            raise
+
+    def read_reply(self) -> object:
+        """Reads and decodes one RESP reply"""
+        line = self.local.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by the server")
+        kind, data = line[:1], line[1:-2]
+        if kind == b"+":
+            return data.decode()
+        if kind == b"-":
+            raise RuntimeError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            length = int(data)
+            if length < 0:
+                return None
+            return self.local.reader.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(data)
+            if length < 0:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise RuntimeError("unexpected reply {!r}".format(line))
+
+    def set(self, session_id: str, session: dict, ttl: int = None) -> None:
+        """Stores a session"""
+        value = "{}\n{}".format(session['user_id'],
+                                session['created_at'].isoformat())
+        if ttl is not None and ttl > 0:
+            self.command('SET', session_id, value, 'EX', ttl)
+        else:
+            self.command('SET', session_id, value)
+
+    def get(self, session_id: str) -> dict:
+        """Returns the session of a Session ID, or None"""
+        value = self.command('GET', session_id)
+        if value is None:
+            return None
+        user_id, created_at = value.decode().split("\n", 1)
+        return {'user_id': user_id,
+                'created_at': datetime.fromisoformat(created_at)}
+
+    def delete(self, session_id: str) -> bool:
+        """Deletes a session, returns False if it didn't exist"""
+        return self.command('DEL', session_id) > 0
+
+    def delete_many(self, session_ids: Iterable[str]) -> int:
+        """Deletes several sessions with a single command"""
+        session_ids = list(session_ids)
+        if not session_ids:
+            return 0
+        return self.command('DEL', *session_ids)
+
+
+def get_session_store(sessions: dict = None,
+                      user_id_only: bool = False) -> SessionStore:
+    """Returns the session storage selected by SESSION_STORE
+
+    - memory (default): `sessions` dictionary of the current process,
+      mapping Session IDs to User IDs if `user_id_only`
+    - sqlite: file SESSION_STORE_PATH, shared by the workers of a host
+    - redis: server at SESSION_STORE_URL
+    """
+    store_type = getenv('SESSION_STORE', 'memory')
+    if store_type == 'sqlite':
+        return SQLiteSessionStore(
+            getenv('SESSION_STORE_PATH', '.db_sessions.sqlite'))
+    if store_type == 'redis':
+        return RedisSessionStore(
+            getenv('SESSION_STORE_URL', 'redis://localhost:6379/0'))
+    return MemorySessionStore(sessions, user_id_only)
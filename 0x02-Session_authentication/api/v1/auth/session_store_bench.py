@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark of session lookups per second for each session store backend,
+from several worker processes at once:
+
+    python3 -m api.v1.auth.session_store_bench [-p PROCESSES] [-n SESSIONS]
+
+The Redis backend runs against the local fake server, so its figures
+measure the client and protocol, not a real Redis.
+"""
+from api.v1.auth.fake_redis import FakeRedisServer
+from api.v1.auth.session_store import (MemorySessionStore, RedisSessionStore,
+                                       SQLiteSessionStore, SessionStore)
+from datetime import datetime
+from typing import Callable, List
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+
+def lookups(make_store: Callable[[], SessionStore], session_ids: List[str],
+            duration: float, results) -> None:
+    """Worker: looks random sessions up for `duration` seconds"""
+    store = make_store()
+    count, deadline = 0, time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for session_id in random.sample(session_ids, 100):
+            if store.get(session_id) is None:
+                raise RuntimeError("session {} not found".format(session_id))
+        count += 100
+    results.put(count)
+
+
+def run(name: str, make_store: Callable[[], SessionStore], sessions: int,
+        processes: int, duration: float) -> None:
+    """Fills a store and prints the lookups per second of the workers"""
+    store = make_store()
+    now = datetime.now()
+    session_ids = ["session-{}".format(i) for i in range(sessions)]
+    for session_id in session_ids:
+        store.set(session_id, {'user_id': session_id, 'created_at': now})
+
+    # fork, so that the memory backend workers inherit the sessions
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [context.Process(target=lookups,
+                               args=(lambda: store if name == "memory"
+                                     else make_store(),
+                                     session_ids, duration, results))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    total = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    print("{:8s} {:>12,.0f} lookups/s ({} processes)".format(
+        name, total / duration, processes))
+
+
+def main() -> None:
+    """Parses the command line and benchmarks every backend"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('-p', '--processes', type=int,
+                        default=os.cpu_count())
+    parser.add_argument('-n', '--sessions', type=int, default=10000)
+    parser.add_argument('-d', '--duration', type=float, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, "sessions.sqlite")
+        server = FakeRedisServer().start()
+        for name, make_store in (
+                ("memory", MemorySessionStore),
+                ("sqlite", lambda: SQLiteSessionStore(file_path)),
+                ("redis", lambda: RedisSessionStore(server.url))):
+            run(name, make_store, args.sessions, args.processes,
+                args.duration)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
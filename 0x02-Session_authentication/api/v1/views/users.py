@@ -2,18 +2,117 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request
 from models.user import User
+from typing import Iterator
+
+
+PAGE_SIZE = 100
+STREAM_CHUNK_SIZE = 1000
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: page size, users are ordered by creation date then ID
+      - cursor: value of the X-Next-Cursor header of the previous page
+      - stream: "1" to stream every user in chunks, in the same order
+    Return:
+      - list of User objects JSON represented
+      - 400 if limit or cursor is invalid
+    """
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if request.args.get('stream') == '1':
+        return Response(_stream_users(), mimetype='application/json')
+    if limit is None and cursor is None:
+        all_users = ",".join(user.to_json_string() for user in User.all())
+        return Response("[{}]\n".format(all_users),
+                        mimetype='application/json')
+
+    if limit is None:
+        limit = PAGE_SIZE
+    elif not limit.isdigit() or int(limit) <= 0:
+        return jsonify({'error': "limit must be a positive integer"}), 400
+    try:
+        users, next_cursor = User.page(cursor, int(limit))
+    except ValueError:
+        return jsonify({'error': "invalid cursor"}), 400
+    body = ",".join(user.to_json_string() for user in users)
+    response = Response("[{}]\n".format(body), mimetype='application/json')
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+def _stream_users() -> Iterator[str]:
+    """ Yield the JSON list of all users, one page at a time
+    """
+    yield "["
+    users, cursor = User.page(None, STREAM_CHUNK_SIZE)
+    first = True
+    while users:
+        chunk = ",".join(user.to_json_string() for user in users)
+        yield chunk if first else "," + chunk
+        first = False
+        if cursor is None:
+            break
+        users, cursor = User.page(cursor, STREAM_CHUNK_SIZE)
+    yield "]\n"
+
+
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def create_users() -> str:
+    """ POST /api/v1/users/bulk
+    JSON body:
+      - list of users, each with email, password, last_name (optional)
+        and first_name (optional)
     Return:
-      - list of all User objects JSON represented
+      - list of results in the order of the body: the User object JSON
+        represented, or an error for a user that can't be created
+        (missing or non-string email or password, email already used
+        by a stored user or an earlier item); the valid users are saved
+        together with a single write
+      - 400 if the body isn't a list
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    rj = request.get_json(silent=True)
+    if not isinstance(rj, list):
+        return jsonify({'error': "Wrong format"}), 400
+
+    results, users, emails = [], [], set()
+    for item in rj:
+        error_msg = None
+        if not isinstance(item, dict):
+            error_msg = "Wrong format"
+        elif item.get("email") in (None, ""):
+            error_msg = "email missing"
+        elif not isinstance(item.get("email"), str):
+            error_msg = "email must be a string"
+        elif item.get("password") in (None, ""):
+            error_msg = "password missing"
+        elif not isinstance(item.get("password"), str):
+            error_msg = "password must be a string"
+        elif item["email"] in emails or User.search({'email': item["email"]}):
+            error_msg = "email already exists"
+        if error_msg is not None:
+            results.append({'error': error_msg})
+            continue
+        emails.add(item["email"])
+        user = User()
+        user.email = item.get("email")
+        user.password = item.get("password")
+        user.first_name = item.get("first_name")
+        user.last_name = item.get("last_name")
+        users.append(user)
+        results.append(user)
+
+    try:
+        User.save_many(users)
+    except Exception as e:
+        return jsonify({'error': "Can't create Users: {}".format(e)}), 400
+    return jsonify([r.to_json() if isinstance(r, User) else r
+                    for r in results]), 201
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -2,19 +2,54 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import Callable, TypeVar, List, Iterable, Tuple
+from os import getenv, path
+import base64
+import bisect
 import json
+import mmap
+import os
+import threading
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+PENDING = {}
+JOURNALS = {}
+LOCK = threading.RLock()
+
+# 'file' rewrites .db_<Class>.json on each write, 'journal' appends the
+# write to .db_<Class>.journal and compacts it into the snapshot later
+STORAGE = getenv('MODELS_STORAGE', 'file')
+FSYNC = getenv('MODELS_FSYNC', '0') == '1'
+JOURNAL_MAX_BYTES = int(getenv('MODELS_JOURNAL_MAX_BYTES', 16 * 1024 * 1024))
+# keep loaded records as raw JSON until an object is first looked up
+LAZY_LOAD = getenv('MODELS_LAZY_LOAD', '0') == '1'
+# drop the per-instance __dict__: objects only hold their slotted fields
+COMPACT = getenv('MODELS_COMPACT', '0') == '1'
+INDEXES = {}
+INDEXED = {}
+UNINDEXED = object()
+# per class, sorted (created_at, id) keys giving a stable listing order
+ORDERS = {}
 
 
 class Base():
     """ Base class
+
+    Subclasses can declare `__indexes__`, a tuple of attribute names
+    kept in a hash index so `search()` on them doesn't scan every object,
+    and `__storage__` to use another storage mode than MODELS_STORAGE.
+
+    Fields live in `__slots__`; subclasses list their own fields there.
+    Other attributes go to `__dict__`, unless MODELS_COMPACT is set.
+    The public JSON representation is cached until an attribute is set.
     """
+    __slots__ = ('id', 'created_at', 'updated_at', '__json') + \
+        (() if COMPACT else ('__dict__',))
+    __indexes__ = ()
+    __storage__ = None
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
@@ -23,18 +58,37 @@ class Base():
         if DATA.get(s_class) is None:
             DATA[s_class] = {}
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        if 'id' in kwargs:
+            self.id = kwargs['id']
+        else:
+            self.id = str(uuid.uuid4())
+        # TIMESTAMP_FORMAT is ISO 8601, fromisoformat parses it much faster
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = datetime.fromisoformat(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = datetime.fromisoformat(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    def __setattr__(self, name: str, value: object):
+        """ Set an attribute and drop the cached JSON representation
+
+        Setting an indexed attribute of a stored object moves it in the
+        indexes right away, so `search()` sees the new value before
+        `save()`, like a scan of the objects would.
+        """
+        object.__setattr__(self, name, value)
+        if name != '_Base__json':
+            object.__setattr__(self, '_Base__json', None)
+            if name in self.__indexes__:
+                cls = self.__class__
+                obj_id = getattr(self, 'id', None)
+                if DATA.get(cls.__name__, {}).get(obj_id) is self:
+                    with LOCK:
+                        cls._index_add(obj_id, self)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -47,8 +101,32 @@ class Base():
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
+        if not for_serialization:
+            return dict(self._json_cache()[0])
+        return self._to_json(True)
+
+    def to_json_string(self) -> str:
+        """ Return the cached JSON text of `to_json()`, as `jsonify` would
+        render it, so list views can join it without rebuilding dicts
+        """
+        return self._json_cache()[1]
+
+    def _json_cache(self) -> Tuple[dict, str]:
+        """ Return the cached (dictionary, JSON text) public representation
+        """
+        cache = getattr(self, '_Base__json', None)
+        if cache is None:
+            result = self._to_json(False)
+            cache = (result, json.dumps(result, sort_keys=True,
+                                        separators=(',', ':')))
+            self.__json = cache
+        return cache
+
+    def _to_json(self, for_serialization: bool) -> dict:
+        """ Build the JSON dictionary of the object
+        """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self._attributes():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,56 +135,422 @@ class Base():
                 result[key] = value
         return result
 
+    def _attributes(self) -> Iterable[Tuple[str, object]]:
+        """ Iterate over (name, value) of the slotted and dict attributes
+        """
+        for key in self.__class__._fields():
+            try:
+                yield key, getattr(self, key)
+            except AttributeError:
+                continue
+        yield from getattr(self, '__dict__', {}).items()
+
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    def _fields(cls) -> Tuple[str, ...]:
+        """ Names of the slotted fields of the class, base classes first
+        """
+        fields = cls.__dict__.get('_Base__fields')
+        if fields is None:
+            fields = tuple(
+                key for klass in reversed(cls.__mro__)
+                for key in klass.__dict__.get('__slots__', ())
+                if not key.startswith('__'))
+            setattr(cls, '_Base__fields', fields)
+        return fields
+
+    @classmethod
+    def load_from_file(cls, lazy: bool = None,
+                       progress: Callable[[int, int], None] = None):
+        """ Load all objects from file, then replay the journal on top
+
+        Records are streamed from a memory-mapped snapshot. With `lazy`
+        (default: MODELS_LAZY_LOAD) they stay serialized bytes in PENDING
+        and an object is only built when `get()` or `search()` hits it.
+        `progress(loaded_bytes, total_bytes)` is called while loading.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        if lazy is None:
+            lazy = LAZY_LOAD
+        with LOCK:
+            cls._journal_close()
+            DATA[s_class] = {}
+            PENDING[s_class] = {}
+            cls._index_rebuild()
+            created = {}
+            if path.exists(file_path):
+                for obj_id, obj_json, raw in cls._iter_file(file_path,
+                                                            progress):
+                    created[obj_id] = obj_json.get('created_at') or ''
+                    if lazy:
+                        PENDING[s_class][obj_id] = raw
+                        cls._index_add(obj_id, obj_json)
+                    else:
+                        DATA[s_class][obj_id] = cls(**obj_json)
+                        cls._index_add(obj_id, DATA[s_class][obj_id])
+            cls._journal_replay(lazy, created)
+            ORDERS[s_class] = sorted(
+                (created_at, obj_id) for obj_id, created_at in created.items())
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @staticmethod
+    def _iter_file(file_path: str,
+                   progress: Callable[[int, int], None] = None
+                   ) -> Iterable[Tuple[str, dict, bytes]]:
+        """ Yield (id, JSON dictionary, serialized JSON) from a snapshot file
+
+        save_to_file() writes one record per line, which is parsed line
+        by line from a memory map; any other layout is loaded at once.
+        """
+        with open(file_path, 'rb') as f:
+            total = os.fstat(f.fileno()).st_size
+            if total == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.readline() != b"{\n":
+                    for obj_id, obj_json in json.loads(mm[:]).items():
+                        yield obj_id, obj_json, json.dumps(obj_json).encode()
+                    if progress is not None:
+                        progress(total, total)
+                    return
+                count = 0
+                line = mm.readline()
+                while line and line != b"}\n" and line != b"}":
+                    line = line.rstrip(b",\n")
+                    for obj_id, obj_json in json.loads(b"{" + line + b"}"
+                                                       ).items():
+                        # the line is '<json id>: <json object>'
+                        raw = line[len(json.dumps(obj_id)) + 2:]
+                        yield obj_id, obj_json, raw
+                    count += 1
+                    if progress is not None and count % 10000 == 0:
+                        progress(mm.tell(), total)
+                    line = mm.readline()
+                if progress is not None:
+                    progress(total, total)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+
+        The snapshot is written to a temporary file and renamed over the
+        old one, so a crash never leaves a half-written snapshot; the
+        journal is emptied once the snapshot is in place.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with LOCK:
+            objs = [(obj_id, json.dumps(obj.to_json(True)))
+                    for obj_id, obj in DATA[s_class].items()]
+            objs.extend((obj_id, raw.decode())
+                        for obj_id, raw in PENDING.get(s_class, {}).items())
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            tmp_path = "{}.tmp".format(file_path)
+            with open(tmp_path, 'w') as f:
+                f.write("{\n")
+                f.write(",\n".join(
+                    "{}: {}".format(json.dumps(obj_id), obj_json)
+                    for obj_id, obj_json in objs))
+                f.write("\n}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+            cls._journal_close()
+            journal_path = ".db_{}.journal".format(s_class)
+            if path.exists(journal_path):
+                os.remove(journal_path)
+
+    @classmethod
+    def _journal_append(cls, *records: dict):
+        """ Append writes to the journal in one go, compacting it if too
+        big
+        """
+        s_class = cls.__name__
+        with LOCK:
+            f = JOURNALS.get(s_class)
+            if f is None:
+                f = open(".db_{}.journal".format(s_class), 'a')
+                JOURNALS[s_class] = f
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+            f.flush()
+            if FSYNC:
+                os.fsync(f.fileno())
+            if f.tell() >= JOURNAL_MAX_BYTES:
+                cls.save_to_file()
+
+    @classmethod
+    def _journal_close(cls):
+        """ Close the journal file handle of the class, if open
+        """
+        f = JOURNALS.pop(cls.__name__, None)
+        if f is not None:
+            f.close()
+
+    @classmethod
+    def _journal_replay(cls, lazy: bool = False, created: dict = None):
+        """ Apply the journal records to DATA, and to the `created`
+        map of ID to created_at when given
+
+        A torn last record (crash in the middle of a write) is dropped
+        and truncated away so later appends start on a clean line.
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        if not path.exists(journal_path):
+            return
+
+        offset = 0
+        with open(journal_path, 'rb+') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    f.truncate(offset)
+                    break
+                offset += len(line)
+                if record.get('op') == 'save':
+                    obj_json = record['obj']
+                    obj_id = obj_json['id']
+                    DATA[s_class].pop(obj_id, None)
+                    if created is not None:
+                        created[obj_id] = obj_json.get('created_at') or ''
+                    if lazy:
+                        PENDING[s_class][obj_id] = json.dumps(
+                            obj_json).encode()
+                        cls._index_add(obj_id, obj_json)
+                    else:
+                        DATA[s_class][obj_id] = cls(**obj_json)
+                        cls._index_add(obj_id, DATA[s_class][obj_id])
+                elif record.get('op') == 'remove':
+                    if created is not None:
+                        created.pop(record['id'], None)
+                    DATA[s_class].pop(record['id'], None)
+                    PENDING[s_class].pop(record['id'], None)
+                    cls._index_discard(record['id'])
 
     def save(self):
         """ Save current object
+
+        The whole write holds LOCK, so a compaction or a snapshot in
+        another thread never sees DATA, the indexes or the journal half
+        updated.
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with LOCK:
+            self.updated_at = datetime.utcnow()
+            if self.id not in DATA[s_class] and \
+                    self.id not in PENDING.get(s_class, {}):
+                bisect.insort(ORDERS.setdefault(s_class, []),
+                              self._order_key())
+            DATA[s_class][self.id] = self
+            PENDING.get(s_class, {}).pop(self.id, None)
+            self.__class__._index_add(self.id, self)
+            if (self.__storage__ or STORAGE) == 'journal':
+                self.__class__._journal_append(
+                    {'op': 'save', 'obj': self.to_json(True)})
+            else:
+                self.__class__.save_to_file()
+
+    @classmethod
+    def save_many(cls, objs: Iterable[TypeVar('Base')]
+                  ) -> List[TypeVar('Base')]:
+        """ Save several objects of the class with a single write: one
+        snapshot of the file, or one append of all their journal records
+        """
+        objs = list(objs)
+        s_class = cls.__name__
+        with LOCK:
+            now = datetime.utcnow()
+            pending = PENDING.get(s_class, {})
+            order = ORDERS.setdefault(s_class, [])
+            new_keys = []
+            for obj in objs:
+                obj.updated_at = now
+                if obj.id not in DATA[s_class] and obj.id not in pending:
+                    new_keys.append(obj._order_key())
+                DATA[s_class][obj.id] = obj
+                pending.pop(obj.id, None)
+                cls._index_add(obj.id, obj)
+            if new_keys:
+                order.extend(new_keys)
+                order.sort()
+            if not objs:
+                return objs
+            if (cls.__storage__ or STORAGE) == 'journal':
+                cls._journal_append(*({'op': 'save', 'obj': obj.to_json(True)}
+                                      for obj in objs))
+            else:
+                cls.save_to_file()
+        return objs
 
     def remove(self):
-        """ Remove object
+        """ Remove object, holding LOCK for the whole write like save()
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
+        with LOCK:
+            PENDING.get(s_class, {}).pop(self.id, None)
+            if DATA[s_class].get(self.id) is None:
+                return
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            self.__class__._index_discard(self.id)
+            order = ORDERS.get(s_class, [])
+            key = self._order_key()
+            i = bisect.bisect_left(order, key)
+            if i < len(order) and order[i] == key:
+                del order[i]
+            if (self.__storage__ or STORAGE) == 'journal':
+                self.__class__._journal_append(
+                    {'op': 'remove', 'id': self.id})
+            else:
+                self.__class__.save_to_file()
+
+    def _order_key(self) -> Tuple[str, str]:
+        """ Key of the object in the (created_at, id) listing order
+        """
+        return (self.created_at.strftime(TIMESTAMP_FORMAT), self.id)
+
+    @classmethod
+    def page(cls, cursor: str = None, limit: int = None
+             ) -> Tuple[List[TypeVar('Base')], str]:
+        """ Return up to `limit` objects ordered by (created_at, id),
+        starting after `cursor`, and the cursor of the next page (None on
+        the last page). Raises ValueError for a malformed cursor.
+        """
+        s_class = cls.__name__
+        order = ORDERS.get(s_class, [])
+        start = 0
+        if cursor is not None:
+            try:
+                key = base64.urlsafe_b64decode(cursor.encode()).decode()
+            except Exception:
+                raise ValueError("invalid cursor")
+            if ' ' not in key:
+                raise ValueError("invalid cursor")
+            start = bisect.bisect_right(order, tuple(key.split(' ', 1)))
+        end = len(order) if limit is None else start + limit
+        keys = order[start:end]
+
+        objs = []
+        for created_at, obj_id in keys:
+            obj = cls.get(obj_id)
+            if obj is not None:
+                objs.append(obj)
+        next_cursor = None
+        if keys and end < len(order):
+            next_cursor = base64.urlsafe_b64encode(
+                " ".join(keys[-1]).encode()).decode()
+        return objs, next_cursor
+
+    @classmethod
+    def _index_rebuild(cls):
+        """ Rebuild the secondary indexes from the loaded objects
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls.__indexes__}
+        INDEXED[s_class] = {}
+        for obj_id, obj in DATA.get(s_class, {}).items():
+            cls._index_add(obj_id, obj)
+        for obj_id, raw in PENDING.get(s_class, {}).items():
+            cls._index_add(obj_id, json.loads(raw))
+
+    @classmethod
+    def _index_add(cls, obj_id: str, obj: TypeVar('Base')):
+        """ Add (or move) one object in the secondary indexes
+
+        `obj` is either an instance or its not yet loaded JSON dictionary.
+        A value held by a single object maps straight to its ID, shared
+        values map to an insertion-ordered dict of IDs.
+        """
+        if not cls.__indexes__:
+            return
+        s_class = cls.__name__
+        cls._index_discard(obj_id)
+        indexes = INDEXES.setdefault(s_class, {})
+        keys = []
+        for attr in cls.__indexes__:
+            if isinstance(obj, dict):
+                value = obj.get(attr)
+            else:
+                value = getattr(obj, attr, None)
+            index = indexes.setdefault(attr, {})
+            try:
+                ids = index.get(value)
+            except TypeError:
+                # unhashable values can't be indexed, search() scans them
+                keys.append(UNINDEXED)
+                continue
+            if ids is None:
+                index[value] = obj_id
+            elif isinstance(ids, dict):
+                ids[obj_id] = None
+            else:
+                index[value] = {ids: None, obj_id: None}
+            keys.append(value)
+        INDEXED.setdefault(s_class, {})[obj_id] = tuple(keys)
+
+    @classmethod
+    def _index_discard(cls, obj_id: str):
+        """ Remove one object from the secondary indexes
+        """
+        s_class = cls.__name__
+        keys = INDEXED.get(s_class, {}).pop(obj_id, None)
+        if keys is None:
+            return
+        indexes = INDEXES[s_class]
+        for attr, value in zip(cls.__indexes__, keys):
+            if value is UNINDEXED:
+                continue
+            index = indexes[attr]
+            ids = index.get(value)
+            if ids == obj_id:
+                del index[value]
+            elif isinstance(ids, dict):
+                ids.pop(obj_id, None)
+                if len(ids) == 1:
+                    index[value] = next(iter(ids))
+
+    @classmethod
+    def _index_lookup(cls, attributes: dict) -> Iterable[str]:
+        """ Return the IDs matching the most selective indexed attribute
+        of the query, or None if no indexed attribute can be used
+        """
+        indexes = INDEXES.get(cls.__name__, {})
+        best = None
+        for k, v in attributes.items():
+            if k not in cls.__indexes__ or k not in indexes:
+                continue
+            try:
+                ids = indexes[k].get(v, ())
+            except TypeError:
+                continue
+            if isinstance(ids, str):
+                ids = (ids,)
+            if best is None or len(ids) < len(best):
+                best = ids
+        return best
+
+    @classmethod
+    def _materialize(cls, obj_id: str = None):
+        """ Build pending objects (one by ID, or all of them) into DATA
+        """
+        s_class = cls.__name__
+        pending = PENDING.get(s_class)
+        if not pending:
+            return
+        with LOCK:
+            ids = list(pending.keys()) if obj_id is None else [obj_id]
+            for pending_id in ids:
+                raw = pending.pop(pending_id, None)
+                if raw is not None:
+                    DATA[s_class][pending_id] = cls(**json.loads(raw))
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return len(DATA[s_class].keys()) + len(PENDING.get(s_class, {}))
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -119,6 +563,8 @@ class Base():
         """ Return one object by ID
         """
         s_class = cls.__name__
+        if id in PENDING.get(s_class, {}):
+            cls._materialize(id)
         return DATA[s_class].get(id)
 
     @classmethod
@@ -133,5 +579,15 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        objs = DATA[s_class]
+        ids = cls._index_lookup(attributes)
+        if ids is not None:
+            ids = list(ids)
+            for obj_id in ids:
+                if obj_id not in objs:
+                    cls._materialize(obj_id)
+            candidates = [objs[obj_id] for obj_id in ids if obj_id in objs]
+            return list(filter(_search, candidates))
+        cls._materialize()
+        return list(filter(_search, objs.values()))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+""" Benchmark of User.search({'email': ...}) with and without the email
+index, at growing numbers of users:
+
+    python3 -m models.index_bench [-s SIZES]
+
+It runs in a temporary directory, so the .db_*.json files of the
+current directory are left alone.
+"""
+from models.user import User
+from typing import List, Type
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+class IndexedUser(User):
+    """ User with the email index, journaled to keep the fill short
+    """
+    __slots__ = ()
+    __storage__ = 'journal'
+
+
+class UnindexedUser(User):
+    """ User without any index: search() scans every object
+    """
+    __slots__ = ()
+    __indexes__ = ()
+    __storage__ = 'journal'
+
+
+def fill(cls: Type[User], start: int, end: int):
+    """ Save users user-<start>@x.io to user-<end - 1>@x.io
+    """
+    for i in range(start, end, 10000):
+        cls.save_many(cls(email="user-{}@x.io".format(j))
+                      for j in range(i, min(i + 10000, end)))
+
+
+def lookup_time(cls: Type[User], size: int, budget: float = 1) -> float:
+    """ Average seconds of a search on a random email, measured for
+    about `budget` seconds (at least 3 searches)
+    """
+    count, start = 0, time.perf_counter()
+    while count < 3 or time.perf_counter() - start < budget:
+        email = "user-{}@x.io".format(random.randrange(size))
+        if len(cls.search({'email': email})) != 1:
+            raise RuntimeError("{} not found".format(email))
+        count += 1
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    """ Parses the command line and runs the benchmark
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument('-s', '--sizes', default="10000,100000,1000000",
+                        help="comma-separated numbers of users")
+    args = parser.parse_args()
+    sizes: List[int] = sorted(int(size) for size in args.sizes.split(","))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        IndexedUser.load_from_file()
+        UnindexedUser.load_from_file()
+        print("{:>10s} {:>14s} {:>14s} {:>10s}".format(
+            "users", "indexed", "unindexed", "speedup"))
+        stored = 0
+        for size in sizes:
+            fill(IndexedUser, stored, size)
+            fill(UnindexedUser, stored, size)
+            stored = size
+            indexed = lookup_time(IndexedUser, size)
+            unindexed = lookup_time(UnindexedUser, size)
+            print("{:>10,} {:>11.1f} us {:>11.1f} us {:>9,.0f}x".format(
+                size, indexed * 1e6, unindexed * 1e6, unindexed / indexed))
+        IndexedUser._journal_close()
+        UnindexedUser._journal_close()
+
+
+if __name__ == "__main__":
+    main()
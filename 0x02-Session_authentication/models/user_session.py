@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+""" UserSession module
+"""
+from models.base import Base
+
+
+class UserSession(Base):
+    """ UserSession class: a session ID of a user, persisted
+    """
+    __slots__ = ('user_id', 'session_id')
+    __indexes__ = ('session_id',)
+    # one login must not rewrite every stored session
+    __storage__ = 'journal'
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """ Initialize a UserSession instance
+        """
+        super().__init__(*args, **kwargs)
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
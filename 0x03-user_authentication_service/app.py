@@ -9,6 +9,13 @@ app = Flask(__name__)
 AUTH = Auth()
 
 
+@app.teardown_appcontext
+def remove_session(exception: BaseException = None) -> None:
+    """Release the DB session of the request
+    """
+    AUTH.release_db_session()
+
+
 @app.route('/', strict_slashes=False)
 def index() -> str:
     """GET /
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+""" An ASGI app with Authentification, serving the routes of app.py on
+asyncio (run it with any ASGI server, e.g. `uvicorn asgi_app:app`)
+"""
+import json
+import logging
+from http.cookies import SimpleCookie
+from typing import Awaitable, Callable, Dict, Tuple
+from urllib.parse import parse_qsl
+from async_auth import AsyncAuth
+
+
+AUTH = AsyncAuth()
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+def json_response(payload: dict, status: int = 200) -> Response:
+    """Return a JSON response
+    """
+    return status, {"content-type": "application/json"}, \
+        json.dumps(payload).encode() + b"\n"
+
+
+def error(status: int) -> Response:
+    """Return an empty error response, like Flask's abort()
+    """
+    return status, {"content-type": "text/plain"}, b""
+
+
+class Request:
+    """Form fields and cookies of an ASGI HTTP request
+    """
+
+    def __init__(self, scope: dict, body: bytes):
+        """Parse the body and the Cookie header of the request
+        """
+        self.method = scope["method"]
+        self.path = scope["path"].rstrip("/") or "/"
+        self.form = dict(parse_qsl(body.decode("latin-1")))
+        self.cookies = {}
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                cookie = SimpleCookie(value.decode("latin-1"))
+                self.cookies.update((k, m.value) for k, m in cookie.items())
+
+
+async def index(request: Request) -> Response:
+    """GET /
+    """
+    return json_response({"message": "Bienvenue"})
+
+
+async def users(request: Request) -> Response:
+    """POST /users
+    """
+    email, password = request.form.get("email"), request.form.get("password")
+    try:
+        await AUTH.register_user(email, password)
+        return json_response({"email": email, "message": "user created"})
+    except ValueError:
+        return json_response({"message": "email already registered"}, 400)
+
+
+async def login(request: Request) -> Response:
+    """POST /sessions
+    """
+    email, password = request.form.get('email'), request.form.get('password')
+    if not await AUTH.valid_login(email, password):
+        return error(401)
+    session_id = await AUTH.create_session(email)
+    status, headers, body = json_response({"email": email,
+                                           "message": "logged in"})
+    headers["set-cookie"] = "session_id={}; Path=/".format(session_id)
+    return status, headers, body
+
+
+async def logout(request: Request) -> Response:
+    """DELETE /sessions
+    """
+    user = await AUTH.get_user_from_session_id(
+        request.cookies.get('session_id'))
+    if user is None:
+        return error(403)
+    await AUTH.destroy_session(user.id)
+    return 302, {"location": "/"}, b""
+
+
+async def profile(request: Request) -> Response:
+    """GET /profile
+    """
+    user = await AUTH.get_user_from_session_id(
+        request.cookies.get('session_id'))
+    if user is None:
+        return error(403)
+    return json_response({"email": user.email})
+
+
+async def get_reset_password_token(request: Request) -> Response:
+    """POST /reset_password
+    """
+    email = request.form.get("email")
+    try:
+        reset_token = await AUTH.get_reset_password_token(email)
+    except ValueError:
+        return error(403)
+    return json_response({"email": email, "reset_token": reset_token})
+
+
+async def update_password(request: Request) -> Response:
+    """PUT /reset_password
+    """
+    email = request.form.get("email")
+    try:
+        await AUTH.update_password(request.form.get("reset_token"),
+                                   request.form.get("new_password"))
+    except ValueError:
+        return error(403)
+    return json_response({"email": email, "message": "Password updated"})
+
+
+ROUTES: Dict[Tuple[str, str], Callable[[Request], Awaitable[Response]]] = {
+    ("GET", "/"): index,
+    ("POST", "/users"): users,
+    ("POST", "/sessions"): login,
+    ("DELETE", "/sessions"): logout,
+    ("GET", "/profile"): profile,
+    ("POST", "/reset_password"): get_reset_password_token,
+    ("PUT", "/reset_password"): update_password,
+}
+
+
+async def app(scope: dict, receive: Callable, send: Callable) -> None:
+    """ASGI entry point
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await AUTH.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    body, more_body = b"", True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    request = Request(scope, body)
+    handler = ROUTES.get((request.method, request.path))
+    if handler is None:
+        paths = {path for _, path in ROUTES}
+        status, headers, content = error(
+            405 if request.path in paths else 404)
+    else:
+        try:
+            status, headers, content = await handler(request)
+        except Exception:
+            logging.exception("%s %s failed", request.method, request.path)
+            status, headers, content = error(500)
+
+    headers["content-length"] = str(len(content))
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+    })
+    await send({"type": "http.response.body", "body": content})
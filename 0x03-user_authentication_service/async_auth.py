@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Module async_auth
+"""
+import asyncio
+import os
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+from sqlalchemy.orm.exc import NoResultFound
+from async_db import AsyncDB, User
+from auth import generate_uuid, hash_password, needs_rehash
+
+
+class AsyncAuth:
+    """Auth class for asyncio: bcrypt runs on a thread pool (it releases
+    the GIL) sized to the CPUs, so waiting logins only cost a coroutine
+    """
+
+    def __init__(self, db: AsyncDB = None, max_workers: int = None):
+        """AsyncAuth Initializer
+        """
+        self._db = AsyncDB() if db is None else db
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count() or 1)
+
+    async def _run(self, fn, *args):
+        """Run a blocking bcrypt call on the executor
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def close(self) -> None:
+        """Close the database and stop the hashing threads
+        """
+        await self._db.close()
+        self._executor.shutdown()
+
+    async def register_user(self, email: str, password: str) -> User:
+        """Register a new user to the database"""
+        try:
+            await self._db.find_user_by(email=email)
+        except NoResultFound:
+            hashed_password = await self._run(hash_password, password)
+            return await self._db.add_user(email, hashed_password)
+        raise ValueError("User {} already exists".format(email))
+
+    async def valid_login(self, email: str, password: str) -> bool:
+        """Check email and password combinaison, rehashing the password
+        when it was stored with another work factor than the current one
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return False
+        if not await self._run(bcrypt.checkpw, password.encode('utf-8'),
+                               user.hashed_password):
+            return False
+        if needs_rehash(user.hashed_password):
+            await self._db.update_user(
+                user.id,
+                hashed_password=await self._run(hash_password, password),
+            )
+        return True
+
+    async def create_session(self, email: str) -> str:
+        """Creates a new session for the user with the provided email
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return None
+        session_id = generate_uuid()
+        await self._db.update_user(user.id, session_id=session_id)
+        return session_id
+
+    async def get_user_from_session_id(
+            self, session_id: str) -> Union[User, None]:
+        """Get a user from session id
+        """
+        if session_id is None:
+            return None
+        try:
+            return await self._db.find_user_by(session_id=session_id)
+        except NoResultFound:
+            return None
+
+    async def destroy_session(self, user_id: int) -> None:
+        """Destroy session for a user given ID
+        """
+        if user_id is None:
+            return None
+        await self._db.update_user(user_id, session_id=None)
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """Generates a password reset token for a user.
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            raise ValueError()
+        reset_token = generate_uuid()
+        await self._db.update_user(user.id, reset_token=reset_token)
+        return reset_token
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """Updates a user's password given the user's reset token.
+        """
+        if reset_token is None:
+            raise ValueError()
+        try:
+            user = await self._db.find_user_by(reset_token=reset_token)
+        except NoResultFound:
+            raise ValueError()
+        new_password_hash = await self._run(hash_password, password)
+        await self._db.update_user(
+            user.id,
+            hashed_password=new_password_hash,
+            reset_token=None,
+        )
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Asynchronous DB module, on the asyncio extension of SQLAlchemy: it
+needs SQLAlchemy 1.4 or later and aiosqlite
+"""
+import asyncio
+import os
+import sqlite3
+import uuid
+from sqlalchemy import and_, select, update
+from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession,
+                                    create_async_engine)
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import NoResultFound
+
+from db import create_tables, migrate
+from user import Base, User
+
+
+class AsyncDB:
+    """DB class for asyncio, on aiosqlite
+    """
+
+    def __init__(self, url: str = None) -> None:
+        """Initialize a new AsyncDB instance on `url` (a.db by default);
+        the schema is set up by the first query, following
+        DB_SCHEMA_MODE like DB does (reset, persistent or memory)
+        """
+        self._mode = os.getenv("DB_SCHEMA_MODE", "reset")
+        self._keepalive = None
+        if url is None:
+            url = "sqlite+aiosqlite:///a.db"
+            if self._mode == "memory":
+                uri = "file:auth_{}?mode=memory&cache=shared".format(
+                    uuid.uuid4().hex)
+                url = "sqlite+aiosqlite:///{}&uri=true".format(uri)
+                # the database lives as long as one connection to it is open
+                self._keepalive = sqlite3.connect(uri, uri=True)
+        self._engine: AsyncEngine = create_async_engine(url, echo=False)
+        self._sessionmaker = sessionmaker(self._engine, class_=AsyncSession,
+                                          expire_on_commit=False)
+        self._ready = False
+        self._lock = asyncio.Lock()
+
+    async def _init(self) -> None:
+        """Set the schema up once: drop and create the tables (reset),
+        apply the pending migrations (persistent) or create the tables
+        (memory)
+        """
+        if self._ready:
+            return
+        async with self._lock:
+            if not self._ready:
+                async with self._engine.begin() as conn:
+                    if self._mode == "persistent":
+                        await conn.run_sync(migrate)
+                    else:
+                        if self._mode != "memory":
+                            await conn.run_sync(Base.metadata.drop_all)
+                        await conn.run_sync(create_tables)
+                self._ready = True
+
+    async def close(self) -> None:
+        """Close the connections of the engine; an in-memory database is
+        gone afterwards
+        """
+        await self._engine.dispose()
+        if self._keepalive is not None:
+            self._keepalive.close()
+            self._keepalive = None
+
+    async def add_user(self, email: str, hashed_password: str) -> User:
+        """Save a new user to the database
+        """
+        await self._init()
+        new_user = User(email=email, hashed_password=hashed_password)
+        async with self._sessionmaker() as session:
+            session.add(new_user)
+            await session.commit()
+        return new_user
+
+    async def find_user_by(self, **kwargs) -> User:
+        """Find a user based on provided filters
+        """
+        await self._init()
+        filters = []
+        for k, v in kwargs.items():
+            if not hasattr(User, k):
+                raise InvalidRequestError()
+            filters.append(getattr(User, k) == v)
+        async with self._sessionmaker() as session:
+            result = await session.execute(
+                select(User).where(and_(*filters)).limit(1))
+            user = result.scalars().first()
+        if user is None:
+            raise NoResultFound
+        return user
+
+    async def update_user(self, user_id: int, **kwargs) -> None:
+        """Update a user given id and attributes
+        """
+        await self._init()
+        for key in kwargs:
+            if not hasattr(User, key):
+                raise ValueError
+        async with self._sessionmaker() as session:
+            result = await session.execute(
+                update(User).where(User.id == user_id).values(**kwargs))
+            await session.commit()
+        if result.rowcount == 0:
+            raise NoResultFound
@@ -3,16 +3,63 @@
 Module auth
 """
 import bcrypt
+import os
+import time
 import uuid
 from typing import Union
 from sqlalchemy.orm.exc import NoResultFound
 from db import DB, User
 
 
+_rounds = None
+
+
+def _calibrate_rounds(target_ms: float, min_rounds: int = 10,
+                      max_rounds: int = 16) -> int:
+    """Returns the highest bcrypt work factor hashing within target_ms
+    milliseconds on this host
+    """
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        salt = bcrypt.gensalt(rounds)
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        chosen = rounds
+    return chosen
+
+
+def _get_rounds() -> int:
+    """Returns the work factor of new hashes: PASSWORD_HASH_ROUNDS, or
+    calibrated once to PASSWORD_HASH_TARGET_MS, or bcrypt's default 12
+    """
+    global _rounds
+    if _rounds is None:
+        rounds = os.getenv('PASSWORD_HASH_ROUNDS')
+        target_ms = os.getenv('PASSWORD_HASH_TARGET_MS')
+        if rounds:
+            _rounds = int(rounds)
+        elif target_ms:
+            _rounds = _calibrate_rounds(float(target_ms))
+        else:
+            _rounds = 12
+    return _rounds
+
+
+def _hash_rounds(hashed_password: bytes) -> int:
+    """Returns the work factor a bcrypt hash was made with
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode("utf-8")
+    return int(hashed_password.split(b"$")[2])
+
+
 def _hash_password(password: str) -> bytes:
     """Returns a salted hash of the input password
     """
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode("utf-8"),
+                         bcrypt.gensalt(_get_rounds()))
 
 
 def _generate_uuid() -> str:
@@ -20,6 +67,25 @@ def _generate_uuid() -> str:
     return str(uuid.uuid4())
 
 
+def hash_password(password: str) -> bytes:
+    """Returns a salted hash of the input password, at the current work
+    factor, for modules registering users outside of Auth
+    """
+    return _hash_password(password)
+
+
+def generate_uuid() -> str:
+    """Generate a UUID for a session ID or reset token"""
+    return _generate_uuid()
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """Tell whether a hash was made with another work factor than the
+    current one
+    """
+    return _hash_rounds(hashed_password) != _get_rounds()
+
+
 class Auth:
     """Auth class to interact with the authentication database.
     """
@@ -29,6 +95,12 @@ class Auth:
         """
         self._db = DB()
 
+    def release_db_session(self) -> None:
+        """Release the DB session of the current thread, at the end of
+        a request
+        """
+        self._db.remove_session()
+
     def register_user(self, email: str, password: str) -> User:
         """Register a new user to the database"""
         try:
@@ -38,15 +110,23 @@ class Auth:
         raise ValueError("User {} already exists".format(email))
 
     def valid_login(self, email: str, password: str) -> bool:
-        """Check email and password combinaison
+        """Check email and password combinaison, rehashing the password
+        when it was stored with another work factor than the current one
         """
         try:
             user = self._db.find_user_by(email=email)
             if user is not None:
-                return bcrypt.checkpw(
+                if not bcrypt.checkpw(
                     password.encode('utf-8'),
                     user.hashed_password
-                )
+                ):
+                    return False
+                if needs_rehash(user.hashed_password):
+                    self._db.update_user(
+                        user.id,
+                        hashed_password=_hash_password(password),
+                    )
+                return True
         except NoResultFound:
             return False
         return False
@@ -54,13 +134,10 @@ class Auth:
     def create_session(self, email: str) -> str:
         """Creates a new session for the user with the provided email
         """
-        user = None
-        try:
-            user = self._db.find_user_by(email=email)
-        except NoResultFound:
-            return None
         session_id = _generate_uuid()
-        self._db.update_user(user.id, session_id=session_id)
+        if self._db.update_user_by({"email": email},
+                                   session_id=session_id) == 0:
+            return None
         return session_id
 
     def get_user_from_session_id(self, session_id: str) -> Union[User, None]:
@@ -82,30 +159,29 @@ class Auth:
     def get_reset_password_token(self, email: str) -> str:
         """Generates a password reset token for a user.
         """
-        user = None
-        try:
-            user = self._db.find_user_by(email=email)
-        except NoResultFound:
-            user = None
-        if user is None:
-            raise ValueError()
         reset_token = _generate_uuid()
-        self._db.update_user(user.id, reset_token=reset_token)
+        if self._db.update_user_by({"email": email},
+                                   reset_token=reset_token) == 0:
+            raise ValueError()
         return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
         """Updates a user's password given the user's reset token.
+
+        The token is looked up before hashing, so an unknown token costs
+        one indexed SELECT rather than a bcrypt hash; the UPDATE is still
+        guarded by the token in case it was used in the meantime.
         """
-        user = None
+        if reset_token is None:
+            raise ValueError()
         try:
-            user = self._db.find_user_by(reset_token=reset_token)
+            self._db.find_user_by(reset_token=reset_token)
         except NoResultFound:
-            user = None
-        if user is None:
             raise ValueError()
         new_password_hash = _hash_password(password)
-        self._db.update_user(
-            user.id,
+        if self._db.update_user_by(
+            {"reset_token": reset_token},
             hashed_password=new_password_hash,
             reset_token=None,
-        )
+        ) == 0:
+            raise ValueError()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Module bulk_import: registers users in bulk from CSV or JSON Lines
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, IO, Iterable, Iterator, List
+from auth import hash_password
+from db import DB
+
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+
+def read_records(stream: IO[str], fmt: str = "csv") -> Iterator[dict]:
+    """Yield the records of a CSV (with a header line) or JSON Lines
+    stream; each has an email and a password or a bcrypt hashed_password
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError("unknown format {}".format(fmt))
+
+
+def _hash_record(record: dict) -> bytes:
+    """Return the hash to store for a record: its bcrypt hashed_password
+    as is, otherwise a new hash of its password
+    """
+    hashed_password = record.get("hashed_password")
+    if hashed_password:
+        return hashed_password.encode("utf-8")
+    return hash_password(record["password"])
+
+
+def _valid(record: dict) -> bool:
+    """Check that a record has an email and something to store as hash
+    """
+    if not record.get("email"):
+        return False
+    hashed_password = record.get("hashed_password")
+    if hashed_password:
+        return hashed_password.startswith(BCRYPT_PREFIXES)
+    return bool(record.get("password"))
+
+
+def bulk_import(db: DB, records: Iterable[dict], batch_size: int = 5000,
+                workers: int = None) -> Dict[str, int]:
+    """Register users in batches: each batch is deduplicated against
+    itself and the database (one query per 900 emails), its passwords
+    hashed on a pool of `workers` threads (bcrypt releases the GIL),
+    then inserted with one executemany in a single transaction
+
+    Args:
+        db: DB to import into
+        records: Dicts with an email and a password or hashed_password
+        batch_size: Number of records per batch
+        workers: Hashing threads, one per CPU by default
+
+    Returns:
+        Counts of read, imported, duplicate and invalid records
+    """
+    stats = {"read": 0, "imported": 0, "invalid": 0}
+    records = iter(records)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            stats["read"] += len(batch)
+
+            unique: Dict[str, dict] = {}
+            for record in batch:
+                if not _valid(record):
+                    stats["invalid"] += 1
+                elif record["email"] not in unique:
+                    unique[record["email"]] = record
+            for email in db.existing_emails(unique):
+                del unique[email]
+
+            users: List[dict] = [
+                {"email": email, "hashed_password": hashed_password}
+                for email, hashed_password in zip(
+                    unique, pool.map(_hash_record, unique.values()))
+            ]
+            stats["imported"] += db.add_users(users)
+    stats["duplicates"] = \
+        stats["read"] - stats["imported"] - stats["invalid"]
+    return stats
+
+
+def main(argv: List[str] = None) -> None:
+    """Imports the files given on the command line into a.db, keeping
+    its existing users (DB_SCHEMA_MODE defaults to persistent here)
+    """
+    parser = argparse.ArgumentParser(
+        description="Register users in bulk from CSV or JSON Lines files")
+    parser.add_argument('files', nargs='+',
+                        help="files to import, - for standard input")
+    parser.add_argument('-f', '--format', choices=('csv', 'jsonl'),
+                        help="input format (default: from the extension)")
+    parser.add_argument('-b', '--batch-size', type=int, default=5000,
+                        help="records per transaction (default: 5000)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="hashing threads (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DB_SCHEMA_MODE", "persistent")
+    db = DB()
+    start, read = time.perf_counter(), 0
+    for file_path in args.files:
+        fmt = args.format or ("jsonl" if file_path.endswith(
+            (".jsonl", ".ndjson")) else "csv")
+        stream = sys.stdin if file_path == "-" \
+            else open(file_path, newline="")
+        try:
+            stats = bulk_import(db, read_records(stream, fmt),
+                                args.batch_size, args.workers)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        read += stats["read"]
+        print("{}: {read} read, {imported} imported, {duplicates} "
+              "duplicates, {invalid} invalid".format(file_path, **stats))
+    elapsed = time.perf_counter() - start
+    print("{:.1f} s, {:.0f} records/s, peak memory {:.0f} MiB".format(
+        elapsed, read / elapsed if elapsed else 0,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine, tuple_
+import os
+import sqlite3
+import uuid
+from typing import Iterable, List, Set, Union
+from sqlalchemy import (and_, bindparam, create_engine, event, inspect,
+                        text)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext import baked
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm.session import Session
 from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
@@ -11,27 +19,144 @@ import bcrypt
 
 from user import Base, User
 
+_bakery = baked.bakery()
+# SQLite before 3.32 (Ubuntu 18.04 ships 3.22) binds at most 999
+# parameters per statement
+MAX_BOUND_PARAMETERS = 900
+
+
+def create_tables(bind: Union[Engine, Connection]) -> None:
+    """Create the tables that don't exist yet
+    """
+    Base.metadata.create_all(bind)
+
+
+def create_indexes(bind: Union[Engine, Connection]) -> None:
+    """Create the indexes of the users table that a database made before
+    they were declared lacks; creating the unique index on email fails
+    with IntegrityError if the table holds duplicate emails
+    """
+    existing = {index["name"]
+                for index in inspect(bind).get_indexes(User.__tablename__)}
+    for index in User.__table__.indexes:
+        if index.name not in existing:
+            index.create(bind)
+
+
+# Schema migrations, in order: version N is reached by running the N
+# first ones. migrate() runs them under the database write lock, so a
+# process starting at the same time waits and then sees them applied.
+MIGRATIONS = (
+    create_tables,
+    create_indexes,
+)
+
+
+def migrate(bind: Union[Engine, Connection]) -> int:
+    """Apply the migrations a persistent database hasn't run yet, and
+    record its version in the schema_version table
+
+    The write lock is taken (BEGIN IMMEDIATE) before schema_version is
+    read: the sqlite3 driver opens no transaction around DDL by itself,
+    so without it two processes could both see version 0 and both try
+    to create the tables. The migrations and the new version are then
+    committed together. A Connection must be in a transaction that
+    hasn't run any statement yet.
+
+    Returns:
+        The schema version of the database
+    """
+    if isinstance(bind, Engine):
+        with bind.begin() as conn:
+            return migrate(conn)
+    bind.execute(text("BEGIN IMMEDIATE"))
+    bind.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version "
+        "(version INTEGER NOT NULL)"))
+    version = bind.execute(text(
+        "SELECT MAX(version) FROM schema_version")).scalar() or 0
+    for migration in MIGRATIONS[version:]:
+        migration(bind)
+    if version < len(MIGRATIONS):
+        bind.execute(text("INSERT INTO schema_version VALUES (:version)"),
+                     {"version": len(MIGRATIONS)})
+    return len(MIGRATIONS)
+
+
+def _find_query(keys: tuple) -> baked.BakedQuery:
+    """Return the query filtering users on equality with one bound
+    parameter per key; the bakery caches its compiled SQL per set of keys
+    """
+    query = _bakery(lambda session: session.query(User))
+    query.add_criteria(lambda q: q.filter(and_(
+        *(getattr(User, key) == bindparam(key) for key in keys)
+    )), keys)
+    return query
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Tune every new SQLite connection: WAL lets readers run while a
+    writer commits, and writers wait for the lock instead of failing
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.execute("PRAGMA cache_size=-16000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
 
 class DB:
     """DB class
     """
 
     def __init__(self) -> None:
-        """Initialize a new DB instance
+        """Initialize a new DB instance; its pool keeps DB_POOL_SIZE
+        connections (5) plus up to DB_MAX_OVERFLOW extra ones (10)
+
+        DB_SCHEMA_MODE selects how the schema is set up:
+        - reset (default): a.db is emptied and its tables created again
+        - persistent: a.db keeps its data, pending migrations are applied
+        - memory: a new in-memory database, shared by the connections
+          of this instance and gone with it
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        mode = os.getenv("DB_SCHEMA_MODE", "reset")
+        url, self._keepalive = "sqlite:///a.db", None
+        if mode == "memory":
+            uri = "file:auth_{}?mode=memory&cache=shared".format(
+                uuid.uuid4().hex)
+            url = "sqlite:///{}&uri=true".format(uri)
+            # the database lives as long as one connection to it is open
+            self._keepalive = sqlite3.connect(uri, uri=True)
+        self._engine = create_engine(
+            url, echo=False,
+            poolclass=QueuePool,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            connect_args={"check_same_thread": False},
+        )
+        event.listen(self._engine, "connect", _set_sqlite_pragmas)
+        if mode == "persistent":
+            migrate(self._engine)
+        elif mode == "memory":
+            create_tables(self._engine)
+        else:
+            Base.metadata.drop_all(self._engine)
+            create_tables(self._engine)
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session object of the current thread
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        return self.__session()
+
+    def remove_session(self) -> None:
+        """Close the session of the current thread and give its
+        connection back to the pool; call it at the end of a request
+        """
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Save a new user to the database
@@ -41,36 +166,63 @@ class DB:
         self._session.commit()
         return new_user
 
+    def add_users(self, users: List[dict]) -> int:
+        """Insert users (dicts of columns) with one executemany in a
+        single transaction, skipping emails already registered
+
+        Returns:
+            Number of users inserted
+        """
+        if not users:
+            return 0
+        with self._engine.begin() as conn:
+            result = conn.execute(
+                User.__table__.insert().prefix_with("OR IGNORE"), users)
+        return result.rowcount
+
+    def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        """Return which of the emails are already registered, with one
+        query per MAX_BOUND_PARAMETERS emails
+        """
+        emails = list(emails)
+        existing = set()
+        for i in range(0, len(emails), MAX_BOUND_PARAMETERS):
+            chunk = emails[i:i + MAX_BOUND_PARAMETERS]
+            existing.update(
+                email for email, in self._session.query(User.email).filter(
+                    User.email.in_(chunk)))
+        self._session.commit()
+        return existing
+
     def find_user_by(self, **kwargs) -> User:
         """Find a user based on provided filters
         """
-        fields, values = [], []
-        for k, v in kwargs.items():
-            if hasattr(User, k):
-                fields.append(getattr(User, k))
-                values.append(v)
-            else:
+        for k in kwargs:
+            if not hasattr(User, k):
                 raise InvalidRequestError()
-        result = self._session.query(User).filter(
-            tuple_(*fields).in_([tuple(values)])
-        ).first()
+        result = _find_query(tuple(sorted(kwargs)))(
+            self._session).params(**kwargs).first()
         if result is None:
             raise NoResultFound
         return result
 
+    def update_user_by(self, filters: dict, **kwargs) -> int:
+        """Update in a single UPDATE the users matching the filters
+        (equality on each key) and return how many were updated
+        """
+        for k in filters:
+            if not hasattr(User, k):
+                raise InvalidRequestError()
+        for k in kwargs:
+            if not hasattr(User, k):
+                raise ValueError
+        rowcount = self._session.query(User).filter_by(**filters).update(
+            kwargs, synchronize_session=False)
+        self._session.commit()
+        return rowcount
+
     def update_user(self, user_id: int, **kwargs) -> None:
         """Update a user given id and attributes
         """
-        user = self.find_user_by(id=user_id)
-        user_data = {}
-        if user is not None:
-            for key, value in kwargs.items():
-                if hasattr(User, key):
-                    user_data[getattr(User, key)] = value
-                else:
-                    raise ValueError
-            self._session.query(User).filter(User.id == user_id).update(
-                user_data,
-                synchronize_session=False
-            )
-            self._session.commit()
+        if self.update_user_by({"id": user_id}, **kwargs) == 0:
+            raise NoResultFound